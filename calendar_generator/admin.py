@@ -1,7 +1,9 @@
-from django.contrib import admin
-from django.utils.html import format_html
+from django.contrib import admin, messages
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 
 from .models import Holiday, CalendarGeneration, ArtworkOverlay
+from .views import start_generation
 
 
 @admin.register(ArtworkOverlay)
@@ -37,6 +39,29 @@ class HolidayAdmin(admin.ModelAdmin):
 
 @admin.register(CalendarGeneration)
 class CalendarGenerationAdmin(admin.ModelAdmin):
-    list_display = ('__str__', 'created_at')
-    list_filter = ('room_type', 'month', 'year')
-    readonly_fields = ('pdf_file',)
+    list_display = ('__str__', 'status', 'created_at')
+    list_filter = ('status', 'room_type', 'month', 'year')
+    readonly_fields = ('pdf_file', 'status', 'pages_done', 'total_pages', 'seconds_per_page', 'error', 'profile_links')
+    # Profiles are only written by profiled renders and shown as links
+    exclude = ('profile_stats', 'profile_stacks')
+    actions = ['profile_render']
+
+    def profile_links(self, obj):
+        links = [(reverse('download_profile', args=[obj.id, kind]), label)
+                 for kind, label, profile_file in (('stats', 'pstats', obj.profile_stats),
+                                                   ('stacks', 'collapsed stacks', obj.profile_stacks))
+                 if profile_file]
+        if not links:
+            return "Not profiled"
+        return format_html_join(' | ', '<a href="{}">{}</a>', links)
+
+    profile_links.short_description = 'Profile'
+
+    @admin.action(description='Profile a fresh render of the selected calendars')
+    def profile_render(self, request, queryset):
+        for calendar in queryset:
+            profiled = CalendarGeneration.objects.create(room_type=calendar.room_type, month=calendar.month,
+                                                         year=calendar.year, status='pending')
+            start_generation(profiled.id, profile=True)
+        self.message_user(request, f"Profiling {queryset.count()} render(s). The profile links appear on each new "
+                                   f"calendar generation once it finishes.", messages.SUCCESS)
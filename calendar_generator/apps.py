@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class CalendarGeneratorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'calendar_generator'
+
+    def ready(self):
+        # Connects the signal that keeps the holiday index current when artwork is deleted
+        from . import holiday_index  # noqa: F401
+        from .layouts import check_calendar_layouts, render_plans
+
+        checks.register(check_calendar_layouts)
+        # Compile the layouts at startup so a broken CALENDAR_LAYOUTS fails fast
+        render_plans()
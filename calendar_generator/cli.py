@@ -0,0 +1,241 @@
+"""
+Command line renderer that makes calendars without Django.
+
+Renders months straight from the static assets and a holiday file (CSV or
+iCalendar, as the holiday import accepts) with the framework-free engine, so no
+settings, database or web server are needed:
+
+    python -m calendar_generator.cli render 2025-09 2025-12 --holidays holidays.csv --jobs 4
+
+Each room and month is one job; ``--jobs`` renders that many in parallel processes.
+``--layouts`` reads the room layouts from a JSON file shaped like CALENDAR_LAYOUTS
+instead of using the defaults.
+"""
+import calendar
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from enum import Enum
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn, TimeElapsedColumn, TimeRemainingColumn
+
+# The source assets in the repository, the same directory collectstatic copies from
+DEFAULT_STATIC_ROOT = Path(__file__).resolve().parent.parent / 'static'
+
+app = typer.Typer(help="Render room calendars to PDF without Django.", no_args_is_help=True)
+console = Console()
+
+
+class Backend(str, Enum):
+    pil = 'pil'
+    numpy = 'numpy'
+
+
+def parse_month(value):
+    """Parse YYYY-MM into (year, month)."""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        date(year, month, 1)
+    except ValueError:
+        raise typer.BadParameter(f"'{value}' is not a month, expected YYYY-MM")
+    return year, month
+
+
+def month_range(first, last):
+    """Yield (year, month) from ``first`` through ``last``."""
+    year, month = first
+    while (year, month) <= last:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def month_days(year, month):
+    return [date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+
+
+def read_holidays(path):
+    """Read a CSV or iCalendar holiday file into HolidayRecords."""
+    from .engine import HolidayRecord
+    from .holiday_files import READ_ENCODING, HolidayFileError, detect_format, read_csv, read_ics
+
+    reader = read_ics if detect_format(path) == 'ics' else read_csv
+    try:
+        with open(path, newline='', encoding=READ_ENCODING) as holiday_file:
+            return [HolidayRecord(line_number, **fields) for line_number, fields in reader(holiday_file)]
+    except (OSError, HolidayFileError) as e:
+        raise typer.BadParameter(str(e), param_hint='--holidays')
+
+
+def read_layouts(path):
+    """Read room layouts from a JSON file mapping each room type to its layout, as CALENDAR_LAYOUTS does."""
+    try:
+        with open(path, encoding='utf-8') as layouts_file:
+            layouts = json.load(layouts_file)
+    except (OSError, ValueError) as e:
+        raise typer.BadParameter(str(e), param_hint='--layouts')
+    if not isinstance(layouts, dict) or not all(isinstance(layout, dict) for layout in layouts.values()):
+        raise typer.BadParameter("expected an object mapping each room type to its layout", param_hint='--layouts')
+    return layouts
+
+
+def render_month(plan, index, profile, year, month, subdivision, output_path, backend, static_root, progress=None):
+    """Render one room's month to ``output_path``; runs in a worker process when --jobs > 1."""
+    import holidays
+
+    from . import engine
+
+    days = month_days(year, month)
+    public_holidays = holidays.US(subdiv=subdivision, years=year)
+    resolve = engine.index_resolver(plan, index, public_holidays)
+    pages = engine.render_pages(days, plan, resolve, backend, static_root)
+    return engine.write_calendar_pdf(days, pages, profile, plan.page_size, output_path, tempfile.gettempdir(),
+                                     progress)
+
+
+def _render_month_in_worker(arguments, queue, key):
+    """Run render_month in a worker process, reporting each page to the parent through ``queue``."""
+    return render_month(*arguments, progress=lambda pages_done, total_pages, seconds_per_page:
+                        queue.put((key, pages_done)))
+
+
+@app.command()
+def render(
+    first: str = typer.Argument(..., help="First month to render, as YYYY-MM."),
+    last: str = typer.Argument(None, help="Last month to render, as YYYY-MM. Defaults to the first."),
+    rooms: list[str] = typer.Option(None, '--room', '-r', help="Room type to render, repeatable. Defaults to all."),
+    holiday_file: Path = typer.Option(None, '--holidays', help="Holidays as CSV or iCalendar (.ics)."),
+    layouts_file: Path = typer.Option(None, '--layouts',
+                                      help="Room layouts as JSON, shaped like CALENDAR_LAYOUTS. Defaults to the "
+                                           "built-in layouts."),
+    static_root: Path = typer.Option(DEFAULT_STATIC_ROOT, help="Directory the templates and artwork are in."),
+    font: Path = typer.Option(None, help="Date font. Defaults to fonts/SF-Pro-Text-Black.ttf in the static root."),
+    output: Path = typer.Option(Path('calendars'), '--output', '-o', help="Directory the PDFs are written to."),
+    profile_name: str = typer.Option('print', '--profile', help="Output profile."),
+    backend: Backend = typer.Option(None, help="Compositing backend. Defaults to numpy when installed."),
+    jobs: int = typer.Option(1, '--jobs', '-j', min=1, help="Months to render in parallel processes."),
+    subdivision: str = typer.Option('MI', help="US state whose public holidays are looked up by name."),
+):
+    """Render one PDF per room and month."""
+    from . import engine
+
+    first_month = parse_month(first)
+    last_month = parse_month(last) if last else first_month
+    if last_month < first_month:
+        raise typer.BadParameter("the last month is before the first", param_hint='LAST')
+
+    layouts = read_layouts(layouts_file) if layouts_file else engine.DEFAULT_CALENDAR_LAYOUTS
+    if font:
+        layouts = {room_type: {**layout, 'date_text': {**layout.get('date_text', {}), 'font': str(font.resolve())}}
+                   for room_type, layout in layouts.items()}
+    try:
+        plans = engine.compile_layouts(layouts, static_root)
+    except engine.ConfigurationError as e:
+        raise typer.BadParameter(str(e), param_hint='--layouts')
+    rooms = rooms or list(plans)
+    unknown = [room_type for room_type in rooms if room_type not in plans]
+    if unknown:
+        raise typer.BadParameter(f"unknown room type {', '.join(unknown)}, use {', '.join(plans)}",
+                                 param_hint='--room')
+    if profile_name not in engine.DEFAULT_OUTPUT_PROFILES:
+        raise typer.BadParameter(f"unknown profile, use {', '.join(engine.DEFAULT_OUTPUT_PROFILES)}",
+                                 param_hint='--profile')
+    profile = engine.OutputProfile(profile_name, **engine.DEFAULT_OUTPUT_PROFILES[profile_name])
+    backend = (backend or (Backend.numpy if engine.np is not None else Backend.pil)).value
+
+    for room_type in rooms:
+        problems = plans[room_type].asset_problems()
+        if not os.path.exists(plans[room_type].date_font):
+            problems.append(f"date font {plans[room_type].date_font} not found, pass --font")
+        if problems:
+            console.print(f"[red]Layout '{room_type}': {'; '.join(problems)}")
+            raise typer.Exit(2)
+
+    index = engine.HolidayIndex(read_holidays(holiday_file) if holiday_file else [])
+    output.mkdir(parents=True, exist_ok=True)
+    months = list(month_range(first_month, last_month))
+    work = {
+        (room_type, year, month): (
+            plans[room_type], index, profile, year, month, subdivision,
+            str(output / f"{plans[room_type].label}_{calendar.month_name[month]}_{year}.pdf"), backend,
+            str(static_root),
+        )
+        for room_type in rooms for year, month in months
+    }
+    console.print(f"Rendering {len(work)} calendars with {len(index)} holidays, {profile.name} profile "
+                  f"({profile.describe()}), {backend} backend, {min(jobs, len(work))} job(s)")
+
+    started = time.perf_counter()
+    failures = 0
+    with Progress(TextColumn("{task.description:<28}"), BarColumn(), MofNCompleteColumn(), TimeElapsedColumn(),
+                  TimeRemainingColumn(), console=console) as progress:
+        total_pages = sum(len(month_days(year, month)) for _, year, month in work)
+        overall = progress.add_task("[bold]All calendars", total=total_pages)
+        tasks = {key: progress.add_task(f"{plans[key[0]].label} {calendar.month_abbr[key[2]]} {key[1]}",
+                                        total=len(month_days(key[1], key[2])), visible=False) for key in work}
+        pages_done = dict.fromkeys(work, 0)
+
+        def advance(key, done):
+            progress.update(tasks[key], completed=done, visible=done < progress.tasks[tasks[key]].total)
+            progress.advance(overall, done - pages_done[key])
+            pages_done[key] = done
+
+        def finished(key, error):
+            nonlocal failures
+            progress.update(tasks[key], visible=False)
+            if error is None:
+                progress.console.print(f"[green]Wrote[/green] {work[key][6]}")
+            else:
+                failures += 1
+                progress.console.print(f"[red]Failed[/red] {progress.tasks[tasks[key]].description}: {error}")
+
+        if jobs == 1:
+            for key, arguments in work.items():
+                try:
+                    render_month(*arguments, progress=lambda done, total, rate, key=key: advance(key, done))
+                    finished(key, None)
+                except Exception as e:
+                    finished(key, e)
+        else:
+            from multiprocessing import Manager
+            from queue import Empty
+
+            with Manager() as manager, ProcessPoolExecutor(max_workers=jobs) as executor:
+                queue = manager.Queue()
+                futures = {executor.submit(_render_month_in_worker, arguments, queue, key): key
+                           for key, arguments in work.items()}
+                pending = set(futures)
+                while pending:
+                    try:
+                        advance(*queue.get(timeout=0.1))
+                    except Empty:
+                        pass
+                    for future in [future for future in pending if future.done()]:
+                        pending.discard(future)
+                        finished(futures[future], future.exception())
+                while not queue.empty():
+                    advance(*queue.get())
+
+    elapsed = time.perf_counter() - started
+    console.print(f"Done in {elapsed:.1f}s, {total_pages / elapsed:.1f} pages/s"
+                  + (f", [red]{failures} failed" if failures else ""))
+    if failures:
+        raise typer.Exit(1)
+
+
+@app.command()
+def profiles():
+    """List the output profiles."""
+    from .engine import DEFAULT_OUTPUT_PROFILES, OutputProfile
+
+    for name, options in DEFAULT_OUTPUT_PROFILES.items():
+        console.print(f"{name:<12} {OutputProfile(name, **options).describe()}")
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,24 @@
+"""Vectorized alpha compositing used by the batch (NumPy) rendering backend."""
+
+# NumPy is optional; without it generate_calendar uses the PIL backend.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def alpha_blend(base, overlay):
+    """
+    Composite an RGBA overlay onto an opaque RGB image, like Image.alpha_composite.
+
+    Args:
+        base (numpy.ndarray): uint8 array of shape (height, width, 3).
+        overlay (numpy.ndarray): uint8 array of shape (height, width, 4).
+
+    Returns:
+        numpy.ndarray: The blended uint8 RGB array.
+    """
+    alpha = overlay[..., 3:4].astype(np.uint16)
+    # 255 * 255 + 127 still fits in uint16, so the whole blend stays in integer math
+    blended = overlay[..., :3] * alpha + base * (255 - alpha) + 127
+    return (blended // 255).astype(np.uint8)
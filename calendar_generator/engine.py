@@ -0,0 +1,828 @@
+"""
+Framework-free rendering engine for the calendars.
+
+Everything needed to turn a layout, a set of holidays and an output profile into a
+calendar PDF lives here: compiled layouts (RenderPlan), holiday resolution
+(HolidayIndex), page rendering, output profiles and PDF assembly. Nothing in this
+module imports Django, so the command line renderer in cli.py can use it without
+settings or a database. The Django app wraps it in layouts.py, holiday_index.py,
+pdf_output.py and views.py.
+"""
+import bisect
+import io
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+from PyPDF2 import PdfMerger, PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject
+
+from .compositing import alpha_blend, np
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# Longest room type key that fits CalendarGeneration.room_type
+ROOM_TYPE_MAX_LENGTH = 10
+
+CLOSED_TODAY = "images/4_Asset_ClosedToday.png"
+
+# Right edge and baseline of the date on a full-size sheet, and its font relative to the static root
+DEFAULT_DATE_TEXT = {'position': (3274, 114), 'size': 80, 'font': "fonts/SF-Pro-Text-Black.ttf"}
+
+# Printed size of a sheet in inches, US Letter landscape
+DEFAULT_PAGE_SIZE = (11, 8.5)
+
+DEFAULT_CALENDAR_LAYOUTS = {
+    'study': {
+        'label': 'Study Room',
+        # 'default' covers every day without its own template
+        'templates': {
+            'default': "images/SR_0_Asset_WeekdayHours.png",
+            'friday': "images/SR_1_Asset_FridayHours.png",
+            'saturday': "images/SR_2_Asset_SaturdayHours.png",
+            'sunday': "images/SR_3_Asset_SundayHours.png",
+        },
+        'date_text': DEFAULT_DATE_TEXT,
+        'closed_overlay': CLOSED_TODAY,
+        'closed_weekdays': ['sunday'],
+        'page_size': DEFAULT_PAGE_SIZE,
+    },
+    'program': {
+        'label': 'Program Room',
+        'templates': {
+            'default': "images/PR_0_Asset_WeekdayHours.png",
+            'friday': "images/PR_1_Asset_FridayHours.png",
+            'saturday': "images/PR_2_Asset_SaturdayHours.png",
+            'sunday': "images/PR_3_Asset_SundayHours.png",
+        },
+        'date_text': DEFAULT_DATE_TEXT,
+        'closed_overlay': CLOSED_TODAY,
+        'closed_weekdays': ['sunday'],
+        'page_size': DEFAULT_PAGE_SIZE,
+    },
+}
+
+COLOR_MODES = ('rgb', 'gray', 'palette')
+COMPRESSIONS = ('flate', 'jpeg')
+
+DEFAULT_OUTPUT_PROFILES = {
+    # Full source resolution, RGB and JPEG at Pillow's default quality, like pages were written before profiles
+    'original': {'dpi': None, 'color': 'rgb', 'compression': 'jpeg', 'quality': 75},
+    # The sheets are mostly flat color, which a small palette and lossless compression keep sharp
+    'print': {'dpi': 300, 'color': 'palette', 'colors': 64, 'compression': 'flate'},
+    'print-gray': {'dpi': 300, 'color': 'gray', 'compression': 'flate'},
+    'screen': {'dpi': 150, 'color': 'rgb', 'compression': 'jpeg', 'quality': 70},
+}
+
+
+class ConfigurationError(ValueError):
+    """Raised when a layout or output profile is invalid."""
+
+
+def asset_path(path, static_root):
+    """Resolve an asset path relative to ``static_root`` unless it is already absolute."""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(static_root, path)
+
+
+# Layouts
+
+class RenderPlan:
+    """A compiled layout, with every asset path already resolved."""
+
+    def __init__(self, room_type, label, templates, date_position, date_size, closed_overlay, closed_weekdays,
+                 page_size=DEFAULT_PAGE_SIZE, date_font=None):
+        self.room_type = room_type
+        self.label = label
+        # One template path per weekday, Monday first
+        self.templates = templates
+        self.date_position = date_position
+        self.date_size = date_size
+        self.closed_overlay = closed_overlay
+        self.closed_weekdays = closed_weekdays
+        # (width, height) in inches
+        self.page_size = page_size
+        self.date_font = date_font
+
+    def __repr__(self):
+        return f"<RenderPlan {self.room_type}>"
+
+    def template_for(self, single_date):
+        """Return the absolute path of the template a day is printed on."""
+        return self.templates[single_date.weekday()]
+
+    def is_closed_weekday(self, single_date):
+        return single_date.weekday() in self.closed_weekdays
+
+    def asset_paths(self):
+        """Return every distinct asset the plan renders with."""
+        return sorted(set(self.templates)) + [self.closed_overlay]
+
+    def asset_problems(self):
+        """
+        Check the assets on disk, returning a list of problems.
+
+        Every template and the closed overlay must exist and have the same size, since
+        overlays are composited over the whole sheet, and the date must be on the sheet.
+        """
+        problems = []
+        sizes = {}
+        for path in self.asset_paths():
+            try:
+                with Image.open(path) as image:
+                    sizes[path] = image.size
+            except OSError as e:
+                problems.append(f"cannot read {path}: {e}")
+
+        if len(set(sizes.values())) > 1:
+            listed = ', '.join(f"{os.path.basename(path)} is {width}x{height}"
+                               for path, (width, height) in sizes.items())
+            problems.append(f"assets differ in size ({listed})")
+        elif sizes:
+            width, height = next(iter(sizes.values()))
+            x, y = self.date_position
+            if not (0 <= x <= width and 0 <= y <= height):
+                problems.append(f"date position {self.date_position} is outside the {width}x{height} sheet")
+        return problems
+
+
+def _compile_layout(room_type, layout, static_root):
+    if len(room_type) > ROOM_TYPE_MAX_LENGTH:
+        raise ConfigurationError(f"room type '{room_type}' is longer than {ROOM_TYPE_MAX_LENGTH} characters")
+    for key in ('label', 'templates', 'closed_overlay'):
+        if not layout.get(key):
+            raise ConfigurationError(f"layout '{room_type}' is missing '{key}'")
+
+    templates = layout['templates']
+    unknown = set(templates) - set(WEEKDAYS) - {'default'}
+    if unknown:
+        raise ConfigurationError(f"layout '{room_type}' has templates for unknown days: {', '.join(sorted(unknown))}")
+    missing = [day for day in WEEKDAYS if day not in templates and 'default' not in templates]
+    if missing:
+        raise ConfigurationError(f"layout '{room_type}' has no template for {', '.join(missing)} "
+                                 f"and no 'default' template")
+
+    closed_weekdays = layout.get('closed_weekdays', [])
+    unknown = set(closed_weekdays) - set(WEEKDAYS)
+    if unknown:
+        raise ConfigurationError(f"layout '{room_type}' closes on unknown days: {', '.join(sorted(unknown))}")
+
+    date_text = {**DEFAULT_DATE_TEXT, **layout.get('date_text', {})}
+    try:
+        x, y = date_text['position']
+        date_position = (int(x), int(y))
+        date_size = int(date_text['size'])
+    except (TypeError, ValueError):
+        raise ConfigurationError(f"layout '{room_type}' needs a date_text position (x, y) and integer size")
+    if date_size < 1:
+        raise ConfigurationError(f"layout '{room_type}' needs a positive date_text size")
+
+    try:
+        width, height = layout.get('page_size', DEFAULT_PAGE_SIZE)
+        page_size = (float(width), float(height))
+    except (TypeError, ValueError):
+        raise ConfigurationError(f"layout '{room_type}' needs a page_size of (width, height) in inches")
+    if min(page_size) <= 0:
+        raise ConfigurationError(f"layout '{room_type}' needs a positive page_size")
+
+    return RenderPlan(
+        room_type=room_type,
+        label=str(layout['label']),
+        templates=tuple(asset_path(templates.get(day) or templates['default'], static_root) for day in WEEKDAYS),
+        date_position=date_position,
+        date_size=date_size,
+        closed_overlay=asset_path(layout['closed_overlay'], static_root),
+        closed_weekdays=frozenset(WEEKDAYS.index(day) for day in closed_weekdays),
+        page_size=page_size,
+        date_font=asset_path(date_text['font'], static_root),
+    )
+
+
+def compile_layouts(layouts, static_root):
+    """
+    Compile a layout config into {room_type: RenderPlan}.
+
+    Raises ConfigurationError when a layout is incomplete. Asset files are not
+    opened here, see RenderPlan.asset_problems.
+    """
+    if not layouts:
+        raise ConfigurationError("CALENDAR_LAYOUTS must define at least one room type")
+    return {room_type: _compile_layout(room_type, layout, str(static_root))
+            for room_type, layout in layouts.items()}
+
+
+# Holidays
+
+class HolidayRecord:
+    """
+    A holiday as the engine sees it.
+
+    ``artwork_path`` is absolute, or relative to the static root the pages are
+    rendered with.
+    """
+
+    def __init__(self, id, name, date, end_date=None, is_closed=False, artwork_path=None):
+        self.id = id
+        self.name = name
+        self.date = date
+        self.end_date = end_date
+        self.is_closed = is_closed
+        self.artwork_path = artwork_path
+
+    def __repr__(self):
+        return f"<HolidayRecord {self.name} {self.date}>"
+
+
+def holiday_end(holiday):
+    """Return the last day of a holiday, which is its date when it has no (valid) end date."""
+    return max(holiday.date, holiday.end_date or holiday.date)
+
+
+def holiday_priority(holiday):
+    """
+    Sort key that puts the holiday winning a day first.
+
+    The most specific holiday wins: single days before ranges, shorter ranges before
+    longer ones, then the one that started last. Remaining ties go to closures, then
+    to holidays with artwork, then to the oldest record.
+    """
+    return (holiday_end(holiday) - holiday.date, -holiday.date.toordinal(), not holiday.is_closed,
+            not holiday.artwork_path, holiday.id)
+
+
+class HolidayIndex:
+    """
+    Answers which holiday applies to a date, or to a named holiday, in O(log n).
+
+    The calendar is split into segments at every holiday start and end, and the
+    winning holiday of each segment is stored, so finding the holiday for a date is
+    one binary search however many years of closures pile up.
+    """
+
+    def __init__(self, holidays):
+        holidays = sorted(holidays, key=lambda holiday: (holiday.date, holiday.id))
+
+        # Every date where the set of holidays in effect may change, and the winner from there on
+        boundaries = sorted({holiday.date.toordinal() for holiday in holidays} |
+                            {holiday_end(holiday).toordinal() + 1 for holiday in holidays})
+        self._boundaries = boundaries
+        self._winners = []
+        active = []
+        upcoming = iter(holidays)
+        next_holiday = next(upcoming, None)
+        for boundary in boundaries:
+            while next_holiday is not None and next_holiday.date.toordinal() <= boundary:
+                active.append(next_holiday)
+                next_holiday = next(upcoming, None)
+            active = [holiday for holiday in active if holiday_end(holiday).toordinal() >= boundary]
+            winner = min(active, key=holiday_priority) if active else None
+            self._winners.append((winner.artwork_path, winner.is_closed) if winner else None)
+
+        # Holidays with each name, by start date
+        self._by_name = {}
+        for holiday in holidays:
+            self._by_name.setdefault(holiday.name, []).append(holiday)
+        self._name_starts = {name: [holiday.date for holiday in named] for name, named in self._by_name.items()}
+
+    def __len__(self):
+        return sum(len(named) for named in self._by_name.values())
+
+    def for_date(self, single_date):
+        """Return (artwork_path, is_closed) of the holiday winning a date, or None."""
+        position = bisect.bisect_right(self._boundaries, single_date.toordinal()) - 1
+        return self._winners[position] if position >= 0 else None
+
+    def for_name(self, name, single_date=None):
+        """
+        Return (artwork_path, is_closed) of a holiday by name, or None.
+
+        Names repeat from year to year, so this picks the latest holiday with the
+        name that starts on or before ``single_date``, or else the earliest one.
+        """
+        named = self._by_name.get(name)
+        if not named:
+            return None
+        position = bisect.bisect_right(self._name_starts[name], single_date) - 1 if single_date else -1
+        holiday = named[max(position, 0)]
+        return holiday.artwork_path, holiday.is_closed
+
+    def lookup(self, single_date, holiday_name=None):
+        """
+        Return (artwork_path, is_closed) for a day, or None.
+
+        A public holiday falling on the day is looked up by name first, then the day
+        resolves by date, where overlapping holidays resolve by holiday_priority.
+        """
+        if holiday_name:
+            holiday_info = self.for_name(holiday_name, single_date)
+            if holiday_info:
+                return holiday_info
+        if single_date:
+            return self.for_date(single_date)
+        return None
+
+
+def day_overlays(single_date, plan, holiday_info):
+    """
+    Decide the overlays of a day from its resolved holiday.
+
+    ``holiday_info`` is (artwork_path, is_closed) or None, as HolidayIndex.lookup returns.
+
+    Returns:
+        tuple: (artwork_path or None, should_show_closed)
+    """
+    # Determine if building should be marked as closed, either on a day the room is always closed or for a holiday
+    should_show_closed = plan.is_closed_weekday(single_date) or bool(holiday_info and holiday_info[1])
+
+    # Get holiday artwork if it exists
+    holiday_artwork = holiday_info[0] if holiday_info else None
+    return holiday_artwork, should_show_closed
+
+
+def index_resolver(plan, index, public_holidays):
+    """
+    Return a ``resolve(date)`` callable for the renderers, backed by a HolidayIndex.
+
+    ``public_holidays`` maps dates to public holiday names, like the holidays package does.
+    """
+    def resolve(single_date):
+        return day_overlays(single_date, plan, index.lookup(single_date, public_holidays.get(single_date)))
+    return resolve
+
+
+# Pages
+
+@lru_cache(maxsize=8)
+def date_font(font_path, size):
+    """Load the date font once per size instead of once per page."""
+    return ImageFont.truetype(font_path, size)
+
+
+def standard_week(single_date, plan):
+    """Create a mutable calendar sheet from the plan's template for the day of the week."""
+    return Image.open(plan.template_for(single_date)).convert("RGB").copy()
+
+
+def draw_dates(calendarsheet, single_date, plan, scale=1, offset=(0, 0)):
+    """
+    Draw dates on each day of the calendar, where the room type's render plan puts them.
+
+    ``scale`` draws on a sheet scaled down from full size, and ``offset`` draws on a
+    crop of the sheet whose top-left corner is at that position.
+    """
+    draw_dates_ = ImageDraw.Draw(calendarsheet)
+    font = date_font(plan.date_font, round(plan.date_size * scale))
+    x, y = plan.date_position
+    draw_dates_.text(
+        (round(x * scale) - offset[0], round(y * scale) - offset[1]),
+        single_date.strftime("%A — %b, %d, %Y"),
+        (0, 0, 0),
+        anchor="rs",
+        font=font,
+    )
+
+
+def date_text_box(single_date, plan, size):
+    """Return the (left, top, right, bottom) box that draw_dates paints on a full-size sheet."""
+    font = date_font(plan.date_font, plan.date_size)
+    left, top, right, bottom = font.getbbox(single_date.strftime("%A — %b, %d, %Y"), anchor="rs")
+    x, y = plan.date_position
+    # Pad the box so anti-aliased edges are included
+    return (max(0, x + left - 2), max(0, y + top - 2), min(size[0], x + right + 2), min(size[1], y + bottom + 2))
+
+
+def overlays(calendar_sheet, calendar_sheet_filename, art_to_use, closed_overlay, static_root=''):
+    """
+    Imprint closure and/or holiday artwork.
+
+    ``closed_overlay`` is the path of the room type's closure overlay, or None when open.
+    Relative paths are resolved against ``static_root``. A PNG of the result is saved
+    to ``calendar_sheet_filename`` for reference, unless it is None.
+
+    Returns:
+        PIL.Image: The modified calendar sheet with overlays applied
+    """
+    # Convert calendar_sheet to RGBA mode to properly handle alpha channels
+    if calendar_sheet.mode != "RGBA":
+        calendar_sheet = calendar_sheet.convert("RGBA")
+
+    # Handle cases where one or both overlays are present
+    if art_to_use:
+        artwork_image = Image.open(asset_path(art_to_use, static_root)).convert("RGBA")
+        calendar_sheet = Image.alpha_composite(calendar_sheet, artwork_image)
+
+    if closed_overlay:
+        closure_image = Image.open(asset_path(closed_overlay, static_root)).convert("RGBA")
+        calendar_sheet = Image.alpha_composite(calendar_sheet, closure_image)
+
+    if calendar_sheet_filename:
+        calendar_sheet.save(calendar_sheet_filename, format="png")
+
+    # Return the modified calendar sheet
+    return calendar_sheet
+
+
+@lru_cache(maxsize=4)
+def _load_closed_composite(template, closed_overlay, template_modified_time, overlay_modified_time):
+    closed_image = Image.open(closed_overlay).convert("RGBA")
+    calendar_sheet = Image.open(template).convert("RGBA")
+    calendar_sheet.alpha_composite(closed_image)
+    return calendar_sheet.convert("RGB"), closed_image.getchannel("A").getbbox()
+
+
+def closed_composite(template, closed_overlay):
+    """
+    Return (template with the closed overlay blended in, box the overlay covers).
+
+    Cached until either file changes. The image is shared between renders and must
+    be copied before drawing on it.
+    """
+    return _load_closed_composite(template, closed_overlay,
+                                  os.path.getmtime(template), os.path.getmtime(closed_overlay))
+
+
+def closed_day_page(single_date, plan):
+    """
+    Render a closed day without holiday artwork from the cached closed composite.
+
+    The date is normally drawn under the overlay, so this returns None when the
+    overlay covers the date and the page has to be rendered the long way.
+    """
+    calendar_sheet, overlay_box = closed_composite(plan.template_for(single_date), plan.closed_overlay)
+    left, top, right, bottom = date_text_box(single_date, plan, calendar_sheet.size)
+    if overlay_box:
+        overlay_left, overlay_top, overlay_right, overlay_bottom = overlay_box
+        if left < overlay_right and overlay_left < right and top < overlay_bottom and overlay_top < bottom:
+            return None
+
+    calendar_sheet = calendar_sheet.copy()
+    draw_dates(calendar_sheet, single_date, plan)
+    return calendar_sheet
+
+
+def render_pages_batched(days, plan, resolve, static_root=''):
+    """
+    Render pages with the NumPy backend, yielding (date, RGB page) pairs.
+
+    ``resolve(date)`` returns the day's (artwork_path or None, should_show_closed).
+    Days are grouped by (template, artwork, closed) so each group's overlays are blended
+    onto its template only once. Each page then only redraws the small area under its date,
+    which the overlays may cover. Pages are yielded group by group, not in date order.
+    """
+    groups = {}
+    for single_date in days:
+        holiday_artwork, should_show_closed = resolve(single_date)
+        key = (plan.template_for(single_date), holiday_artwork, should_show_closed)
+        groups.setdefault(key, []).append(single_date)
+
+    for (template, holiday_artwork, should_show_closed), group_days in groups.items():
+        if should_show_closed and not holiday_artwork:
+            # Closed days start from the cached composite, leaving only days whose date it covers
+            remaining_days = []
+            for single_date in group_days:
+                calendar_sheet = closed_day_page(single_date, plan)
+                if calendar_sheet is None:
+                    remaining_days.append(single_date)
+                else:
+                    yield single_date, calendar_sheet
+            group_days = remaining_days
+            if not group_days:
+                continue
+
+        template_pixels = np.asarray(Image.open(template).convert("RGB"))
+        overlay_paths = [holiday_artwork] if holiday_artwork else []
+        if should_show_closed:
+            overlay_paths.append(plan.closed_overlay)
+        overlay_pixels = [np.asarray(Image.open(asset_path(path, static_root)).convert("RGBA"))
+                          for path in overlay_paths]
+
+        base_pixels = template_pixels
+        for overlay in overlay_pixels:
+            base_pixels = alpha_blend(base_pixels, overlay)
+        base = Image.fromarray(base_pixels)
+
+        for single_date in group_days:
+            left, top, right, bottom = date_text_box(single_date, plan, base.size)
+            date_area = Image.fromarray(np.ascontiguousarray(template_pixels[top:bottom, left:right]))
+            draw_dates(date_area, single_date, plan, offset=(left, top))
+
+            date_pixels = np.asarray(date_area)
+            for overlay in overlay_pixels:
+                date_pixels = alpha_blend(date_pixels, overlay[top:bottom, left:right])
+
+            calendar_sheet = base.copy()
+            calendar_sheet.paste(Image.fromarray(date_pixels), (left, top))
+            yield single_date, calendar_sheet
+
+
+def render_pages(days, plan, resolve, backend='pil', static_root=''):
+    """
+    Render pages, yielding (date, RGB page) pairs.
+
+    ``resolve(date)`` returns the day's (artwork_path or None, should_show_closed).
+    ``backend`` is 'pil', or 'numpy' when NumPy is installed, which yields pages
+    group by group, not in date order.
+    """
+    if backend == 'numpy' and np is not None:
+        yield from render_pages_batched(days, plan, resolve, static_root)
+        return
+
+    # Generate calendar pages one at a time with PIL
+    for single_date in days:
+        # Get holiday artwork and closure status
+        holiday_artwork, should_show_closed = resolve(single_date)
+
+        # Closed days without artwork start from the cached template + closed overlay composite
+        if should_show_closed and not holiday_artwork:
+            calendar_sheet = closed_day_page(single_date, plan)
+            if calendar_sheet is not None:
+                yield single_date, calendar_sheet
+                continue
+
+        # Figure out which image should be the basis for our calendar page
+        calendar_sheet = standard_week(single_date, plan)
+
+        # Draw correct dates
+        draw_dates(calendar_sheet, single_date, plan)
+
+        # Apply overlays with both holiday artwork and closure status when applicable
+        calendar_sheet = overlays(calendar_sheet, None, holiday_artwork,
+                                  plan.closed_overlay if should_show_closed else None, static_root)
+
+        # Convert back to RGB for PDF saving if needed
+        if calendar_sheet.mode == "RGBA":
+            calendar_sheet = calendar_sheet.convert("RGB")
+        yield single_date, calendar_sheet
+
+
+# Output
+
+class OutputProfile:
+    """A validated output profile."""
+
+    def __init__(self, name, dpi=None, color='rgb', colors=256, compression='flate', quality=75):
+        if dpi is not None and (not isinstance(dpi, int) or dpi < 1):
+            raise ConfigurationError(f"output profile '{name}' needs a positive integer dpi, or None")
+        if color not in COLOR_MODES:
+            raise ConfigurationError(f"output profile '{name}' has unknown color '{color}', "
+                                     f"use {', '.join(COLOR_MODES)}")
+        if compression not in COMPRESSIONS:
+            raise ConfigurationError(f"output profile '{name}' has unknown compression '{compression}', "
+                                     f"use {', '.join(COMPRESSIONS)}")
+        if color == 'palette' and compression == 'jpeg':
+            raise ConfigurationError(f"output profile '{name}' cannot store a palette as JPEG, use flate")
+        if not 2 <= colors <= 256:
+            raise ConfigurationError(f"output profile '{name}' needs between 2 and 256 colors")
+        if not 1 <= quality <= 95:
+            raise ConfigurationError(f"output profile '{name}' needs a JPEG quality between 1 and 95")
+
+        self.name = name
+        self.dpi = dpi
+        self.color = color
+        self.colors = colors
+        self.compression = compression
+        self.quality = quality
+
+    def __repr__(self):
+        return f"<OutputProfile {self.name}>"
+
+    def describe(self):
+        """Return a short summary of the profile, such as "300 dpi, 64-color palette, flate"."""
+        resolution = f"{self.dpi} dpi" if self.dpi else "source resolution"
+        color = f"{self.colors}-color palette" if self.color == 'palette' else self.color
+        compression = f"jpeg q{self.quality}" if self.compression == 'jpeg' else self.compression
+        return f"{resolution}, {color}, {compression}"
+
+    def prepare(self, image, page_size):
+        """Resample and convert an RGB page for this profile; ``page_size`` is in inches."""
+        if self.dpi:
+            size = (round(page_size[0] * self.dpi), round(page_size[1] * self.dpi))
+            if size != image.size:
+                image = image.resize(size, Image.Resampling.LANCZOS)
+
+        match self.color:
+            case 'gray':
+                return image.convert("L")
+            case 'palette':
+                # No dithering, so flat areas stay flat and compress well
+                return image.quantize(self.colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+            case _:
+                return image.convert("RGB")
+
+    def write(self, image, path, page_size):
+        """Write an RGB page as a single-page PDF at ``path``, sized ``page_size`` inches."""
+        image = self.prepare(image, page_size)
+        if self.compression == 'jpeg':
+            # Pillow embeds RGB and grayscale pages as JPEG, at the resolution that gives the page its size
+            image.save(path, format="pdf", quality=self.quality, resolution=image.width / page_size[0])
+        else:
+            with open(path, 'wb') as pdf:
+                pdf.write(flate_page_pdf(image, page_size))
+
+
+def flate_page_pdf(image, page_size):
+    """
+    Return a single-page PDF with the image stored losslessly with FlateDecode.
+
+    Pillow's PDF writer only offers JPEG for RGB and grayscale images and uncompressed
+    hex for palette images, so this writes the few objects a page needs directly.
+    """
+    match image.mode:
+        case "L":
+            color_space = b"/DeviceGray"
+        case "P":
+            palette = image.getpalette("RGB")
+            color_space = b"[/Indexed /DeviceRGB %d <%s>]" % (len(palette) // 3 - 1, bytes(palette).hex().encode())
+        case _:
+            image = image.convert("RGB")
+            color_space = b"/DeviceRGB"
+
+    width, height = image.size
+    page_width, page_height = page_size[0] * 72, page_size[1] * 72
+    pixels = zlib.compress(image.tobytes(), 6)
+    contents = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (page_width, page_height)
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /XObject << /Im0 4 0 R >> >> "
+        b"/Contents 5 0 R >>" % (page_width, page_height),
+        b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s /BitsPerComponent 8 "
+        b"/Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream" % (width, height, color_space, len(pixels), pixels),
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(contents), contents),
+    ]
+
+    pdf = io.BytesIO()
+    pdf.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(pdf.tell())
+        pdf.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref_offset = pdf.tell()
+    pdf.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        pdf.write(b"%010d 00000 n \n" % offset)
+    pdf.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return pdf.getvalue()
+
+
+class StreamingPdfWriter:
+    """
+    Write a PDF to a file object page by page, copying the pages of existing PDFs.
+
+    Each page and the objects it uses are written as soon as its PDF is added, and
+    only the object offsets are kept, so the output can be streamed while it grows
+    and only one source PDF is in memory at a time. The page tree and catalog are
+    written last, once the page count is known.
+    """
+    CATALOG, PAGES = 1, 2
+    # Page attributes a page may inherit from its page tree
+    INHERITABLE = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.position = 0
+        self.offsets = {}
+        self.pages = []
+        self.next_number = self.PAGES + 1
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+
+    def _allocate(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def _write_object(self, number, obj):
+        body = io.BytesIO()
+        obj.write_to_stream(body, None)
+        self.offsets[number] = self.position
+        self._write(b"%d 0 obj\n%s\nendobj\n" % (number, body.getvalue()))
+
+    def _copy(self, obj, numbers):
+        """Copy an object from a source PDF, writing every object it references under a new number."""
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in numbers:
+                numbers[key] = self._allocate()
+                self._write_object(numbers[key], self._copy(obj.get_object(), numbers))
+            return IndirectObject(numbers[key], 0, None)
+        if isinstance(obj, StreamObject):
+            copy = type(obj)()
+            copy._data = obj._data
+            # The length is written from the data, and may be an indirect object in the source
+            copy.update({key: self._copy(value, numbers) for key, value in obj.items() if key != '/Length'})
+            return copy
+        if isinstance(obj, DictionaryObject):
+            return DictionaryObject({key: self._copy(value, numbers) for key, value in obj.items()})
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(value, numbers) for value in obj)
+        return obj
+
+    def add_pdf(self, path):
+        """Append every page of the PDF at ``path``."""
+        numbers = {}
+        for page in PdfReader(path).pages:
+            number = self._allocate()
+            # Annotations may point back at their page
+            numbers[(page.indirect_ref.idnum, page.indirect_ref.generation)] = number
+            page_copy = DictionaryObject({key: self._copy(value, numbers) for key, value in page.items()
+                                          if key != '/Parent'})
+            for key in self.INHERITABLE:
+                node = page
+                while key not in node and '/Parent' in node:
+                    node = node['/Parent'].get_object()
+                if key not in page_copy and key in node:
+                    page_copy[NameObject(key)] = self._copy(node.raw_get(key), numbers)
+            page_copy[NameObject('/Parent')] = IndirectObject(self.PAGES, 0, None)
+            self._write_object(number, page_copy)
+            self.pages.append(number)
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table."""
+        self._write_object(self.PAGES, DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(IndirectObject(number, 0, None) for number in self.pages),
+            NameObject('/Count'): NumberObject(len(self.pages)),
+        }))
+        self._write_object(self.CATALOG, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(self.PAGES, 0, None),
+        }))
+        xref_offset = self.position
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % self.next_number)
+        for number in range(1, self.next_number):
+            self._write(b"%010d 00000 n \n" % self.offsets[number])
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                    % (self.next_number, self.CATALOG, xref_offset))
+
+
+@lru_cache(maxsize=None)
+def new_file_mode():
+    """
+    The mode open() gives new files under the process umask.
+
+    Read once, since the umask can only be read by setting it, which would race
+    with other threads creating files.
+    """
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_calendar_pdf(days, pages, profile, page_size, output_path, work_dir, progress=None):
+    """
+    Write rendered pages as one PDF at ``output_path``, in the order of ``days``.
+
+    ``pages`` yields (date, RGB page) pairs in any order, as render_pages does. Each
+    page is written with ``profile`` into a private directory inside ``work_dir``, so
+    concurrent renders don't clean up each other's pages, and the merged PDF replaces
+    any previous file in one step so readers never see a partial file.
+
+    ``progress``, if given, is called after every page as
+    ``progress(pages_done, total_pages, seconds_per_page)``. It may raise to stop the
+    render; temporary files are removed either way.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    pages_dir = tempfile.mkdtemp(dir=work_dir)
+    merger = PdfMerger()
+    started = time.perf_counter()
+
+    try:
+        page_filenames = {}
+        for single_date, calendar_sheet in pages:
+            page_filenames[single_date] = os.path.join(pages_dir, single_date.strftime("Calendar %A %b %d %Y.pdf"))
+            # Save the calendar page with overlays, as the output profile asks
+            profile.write(calendar_sheet, page_filenames[single_date], page_size)
+            if progress is not None:
+                progress(len(page_filenames), len(days), (time.perf_counter() - started) / len(page_filenames))
+
+        # The batch backend renders pages group by group, so merge them back in date order
+        for single_date in days:
+            merger.append(page_filenames[single_date])
+
+        file_descriptor, partial_path = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(output_path) or '.')
+        os.close(file_descriptor)
+        try:
+            merger.write(partial_path)
+            # mkstemp creates the file readable by its owner only
+            os.chmod(partial_path, new_file_mode())
+            os.replace(partial_path, output_path)
+        except BaseException:
+            os.unlink(partial_path)
+            raise
+    finally:
+        # Clean up temporary files, including after a failed or cancelled render
+        merger.close()
+        shutil.rmtree(pages_dir, ignore_errors=True)
+
+    return output_path
@@ -2,6 +2,7 @@ import datetime
 
 from django import forms
 
+from .layouts import room_choices
 from .models import CalendarGeneration
 
 
@@ -27,3 +28,38 @@ class CalendarGenerationForm(forms.ModelForm):
         # Add custom widgets
         self.fields['room_type'].widget.attrs.update({'class': 'form-control'})
         self.fields['month'].widget.attrs.update({'class': 'form-control'})
+
+
+class CalendarBundleForm(forms.Form):
+    """Form for downloading several calendars at once."""
+    FORMAT_CHOICES = [
+        ('zip', 'ZIP archive'),
+        ('pdf', 'Combined PDF'),
+    ]
+
+    calendars = forms.MultipleChoiceField(widget=forms.CheckboxSelectMultiple)
+    bundle_format = forms.ChoiceField(choices=FORMAT_CHOICES, initial='zip')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # One choice per (room type, month) pair, e.g. "study-1"
+        self.fields['calendars'].choices = [
+            (f"{room_type}-{month}", f"{room_label} — {month_name}")
+            for room_type, room_label in room_choices()
+            for month, month_name in CalendarGeneration.MONTH_CHOICES
+        ]
+
+        # Add custom labels
+        self.fields['calendars'].label = "Calendars"
+        self.fields['bundle_format'].label = "Format"
+
+        # Add custom widgets
+        self.fields['bundle_format'].widget.attrs.update({'class': 'form-control'})
+
+    def clean_calendars(self):
+        """Return the selected calendars as a list of (room_type, month) pairs."""
+        pairs = []
+        for value in self.cleaned_data['calendars']:
+            room_type, month = value.rsplit('-', 1)
+            pairs.append((room_type, int(month)))
+        return pairs
@@ -0,0 +1,210 @@
+"""Reading and writing holidays as CSV and iCalendar (.ics) files."""
+import csv
+from datetime import datetime, timedelta, timezone
+
+# Columns used for CSV import and export
+CSV_FIELDS = ['name', 'date', 'end_date', 'is_closed', 'artwork_path']
+
+# Non-standard iCalendar properties carrying the fields iCalendar has no place for
+ICS_CLOSED_PROPERTY = 'X-ROOMSCALENDAR-CLOSED'
+ICS_ARTWORK_PROPERTY = 'X-ROOMSCALENDAR-ARTWORK'
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'closed'}
+
+# Encoding holiday files are read with. It also skips the byte order mark Excel puts before "CSV UTF-8" files,
+# which would otherwise turn the first header into '\ufeffname'
+READ_ENCODING = 'utf-8-sig'
+
+
+class HolidayFileError(ValueError):
+    """Raised when a row of a holiday file cannot be turned into a holiday."""
+
+    def __init__(self, line_number, message):
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+
+
+def detect_format(path):
+    """Guess the file format ('csv' or 'ics') from the file extension."""
+    return 'ics' if str(path).lower().endswith(('.ics', '.ical')) else 'csv'
+
+
+def parse_bool(value):
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def _holiday_fields(line_number, name, start_date, end_date, is_closed, artwork_path):
+    """Validate one parsed holiday and return it as a dictionary of model fields."""
+    if not name:
+        raise HolidayFileError(line_number, "Holiday name is missing")
+    if end_date and end_date < start_date:
+        raise HolidayFileError(line_number, f"End date {end_date} is before start date {start_date}")
+    return {
+        'name': name,
+        'date': start_date,
+        # Single-day holidays are stored without an end date
+        'end_date': end_date if end_date and end_date != start_date else None,
+        'is_closed': is_closed,
+        'artwork_path': artwork_path or None,
+    }
+
+
+def _parse_date(line_number, value):
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%d").date()
+    except ValueError:
+        raise HolidayFileError(line_number, f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def read_csv(lines):
+    """
+    Yield (line_number, fields) for each holiday in a CSV file.
+
+    The file is read row by row, so arbitrarily large files can be imported.
+    """
+    reader = csv.DictReader(lines)
+    missing = {'name', 'date'} - set(reader.fieldnames or [])
+    if missing:
+        raise HolidayFileError(1, f"Missing required column(s): {', '.join(sorted(missing))}")
+
+    for row in reader:
+        line_number = reader.line_num
+        end_date = row.get('end_date') or ''
+        yield line_number, _holiday_fields(
+            line_number,
+            (row.get('name') or '').strip(),
+            _parse_date(line_number, row.get('date') or ''),
+            _parse_date(line_number, end_date) if end_date.strip() else None,
+            parse_bool(row.get('is_closed')),
+            (row.get('artwork_path') or '').strip(),
+        )
+
+
+def write_csv(stream, holidays):
+    """Write holidays to a CSV stream."""
+    writer = csv.writer(stream)
+    writer.writerow(CSV_FIELDS)
+    for holiday in holidays:
+        writer.writerow([
+            holiday.name,
+            holiday.date.isoformat(),
+            holiday.end_date.isoformat() if holiday.end_date else '',
+            'true' if holiday.is_closed else 'false',
+            holiday.artwork_path or '',
+        ])
+
+
+def _unfold(lines):
+    """Yield (line_number, logical_line) pairs, joining folded iCalendar lines."""
+    current = None
+    current_number = 0
+    for line_number, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current_number, current
+        current, current_number = line, line_number
+    if current is not None:
+        yield current_number, current
+
+
+def _unescape(value):
+    return (value.replace('\\n', '\n').replace('\\N', '\n')
+            .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _parse_ics_date(line_number, value):
+    """Return (date, is_date_only) for a DTSTART/DTEND value."""
+    try:
+        return datetime.strptime(value[:8], "%Y%m%d").date(), 'T' not in value
+    except ValueError:
+        raise HolidayFileError(line_number, f"Invalid iCalendar date '{value}'")
+
+
+def read_ics(lines, default_closed=False):
+    """
+    Yield (line_number, fields) for each VEVENT in an iCalendar file.
+
+    All-day events use an exclusive DTEND, so the last day of the holiday is the
+    day before it. Closure status is read from X-ROOMSCALENDAR-CLOSED and falls
+    back to ``default_closed`` for calendars exported by other applications.
+    """
+    event = None
+    for line_number, line in _unfold(lines):
+        if not line:
+            continue
+        name_and_params, _, value = line.partition(':')
+        name = name_and_params.split(';')[0].upper()
+
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {'line_number': line_number}
+        elif name == 'END' and value.upper() == 'VEVENT' and event is not None:
+            event_line = event['line_number']
+            if 'DTSTART' not in event:
+                raise HolidayFileError(event_line, "Event has no DTSTART")
+            start_date, _ = event['DTSTART']
+            end_date = None
+            if 'DTEND' in event:
+                end_date, date_only = event['DTEND']
+                if date_only:
+                    end_date -= timedelta(days=1)
+            closed = event.get(ICS_CLOSED_PROPERTY)
+            yield event_line, _holiday_fields(
+                event_line,
+                _unescape(event.get('SUMMARY', '')).strip(),
+                start_date,
+                end_date,
+                parse_bool(closed) if closed is not None else default_closed,
+                _unescape(event.get(ICS_ARTWORK_PROPERTY, '')).strip(),
+            )
+            event = None
+        elif event is not None:
+            if name in ('DTSTART', 'DTEND'):
+                event[name] = _parse_ics_date(line_number, value)
+            else:
+                event[name] = value
+
+
+def _fold(line):
+    """Fold a content line to the 75-octet limit required by RFC 5545."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Never split a multi-byte character
+        while (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def write_ics(stream, holidays):
+    """Write holidays to an iCalendar stream as all-day events."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    stream.write(_fold('BEGIN:VCALENDAR'))
+    stream.write(_fold('VERSION:2.0'))
+    stream.write(_fold('PRODID:-//RoomsCalendar//Holidays//EN'))
+    for holiday in holidays:
+        last_day = holiday.end_date or holiday.date
+        stream.write(_fold('BEGIN:VEVENT'))
+        stream.write(_fold(f"UID:{holiday.date:%Y%m%d}-{holiday.pk}@roomscalendar"))
+        stream.write(_fold(f"DTSTAMP:{stamp}"))
+        stream.write(_fold(f"DTSTART;VALUE=DATE:{holiday.date:%Y%m%d}"))
+        stream.write(_fold(f"DTEND;VALUE=DATE:{last_day + timedelta(days=1):%Y%m%d}"))
+        stream.write(_fold(f"SUMMARY:{_escape(holiday.name)}"))
+        stream.write(_fold(f"{ICS_CLOSED_PROPERTY}:{'TRUE' if holiday.is_closed else 'FALSE'}"))
+        if holiday.artwork_path:
+            stream.write(_fold(f"{ICS_ARTWORK_PROPERTY}:{_escape(holiday.artwork_path)}"))
+        stream.write(_fold('END:VEVENT'))
+    stream.write(_fold('END:VCALENDAR'))
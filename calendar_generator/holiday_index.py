@@ -0,0 +1,63 @@
+"""
+In-process index of the Holiday table, so rendering a page doesn't query it day by day.
+
+The index splits the calendar into segments at every holiday start and end, and
+stores the winning holiday of each segment, so finding the holiday for a date is one
+binary search however many years of closures pile up. It is rebuilt whenever the
+table changes, in this process or any other. The index itself (HolidayIndex, and
+the priority deciding overlaps) is in engine.py.
+
+Changes are noticed through the row count, the highest id and the latest
+updated_at. QuerySet.update() does not set auto_now fields, so code that updates
+holidays in bulk must set updated_at=timezone.now() itself, or the index keeps
+serving the old values.
+"""
+import threading
+
+from django.db.models import Count, Max
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .engine import HolidayIndex, HolidayRecord
+from .models import ArtworkOverlay, Holiday
+
+
+def holiday_record(holiday):
+    """Convert a Holiday to the engine's HolidayRecord, preferring its uploaded artwork."""
+    if holiday.artwork and holiday.artwork.image:
+        artwork_path = holiday.artwork.image.path
+    else:
+        # Fall back to artwork_path if no uploaded artwork
+        artwork_path = holiday.artwork_path
+    return HolidayRecord(holiday.id, holiday.name, holiday.date, holiday.end_date, holiday.is_closed, artwork_path)
+
+
+def holiday_table_version():
+    """Return a value that changes whenever a holiday or its artwork is added, edited or deleted."""
+    version = Holiday.objects.aggregate(
+        count=Count('id'), last_id=Max('id'), updated=Max('updated_at'), artwork_updated=Max('artwork__updated_at'),
+    )
+    return tuple(version.values())
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def holiday_index():
+    """Return the index of the current holidays, rebuilding it if the table changed."""
+    global _index, _index_version
+    version = holiday_table_version()
+    with _index_lock:
+        if _index is None or version != _index_version:
+            _index = HolidayIndex(holiday_record(holiday) for holiday in Holiday.objects.select_related('artwork'))
+            _index_version = version
+        return _index
+
+
+@receiver(pre_delete, sender=ArtworkOverlay)
+def touch_holidays_losing_artwork(sender, instance, **kwargs):
+    """Deleting artwork clears it from its holidays with a bulk update, so mark them changed first."""
+    Holiday.objects.filter(artwork=instance).update(updated_at=timezone.now())
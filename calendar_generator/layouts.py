@@ -0,0 +1,76 @@
+"""
+Registry of the calendar layouts for each room type.
+
+A layout says which template each day of the week is printed on, where the date is
+drawn and which overlay marks a closed day. Layouts come from the CALENDAR_LAYOUTS
+setting, falling back to DEFAULT_CALENDAR_LAYOUTS, and are compiled once into
+RenderPlans so rendering never has to look at the config or resolve paths again.
+The layouts and plans themselves are defined in engine.py, which has no Django
+dependency; this module adds the settings, caching and system check.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import engine
+from .engine import DEFAULT_CALENDAR_LAYOUTS
+
+
+def compile_layouts(layouts, static_root):
+    """
+    Compile a layout config into {room_type: RenderPlan}.
+
+    Raises ImproperlyConfigured when a layout is incomplete. Asset files are not
+    opened here, see RenderPlan.asset_problems.
+    """
+    try:
+        return engine.compile_layouts(layouts, static_root)
+    except engine.ConfigurationError as e:
+        raise ImproperlyConfigured(str(e))
+
+
+@lru_cache(maxsize=1)
+def render_plans():
+    """Return the compiled plans for the configured layouts, compiling them on the first call."""
+    return compile_layouts(getattr(settings, 'CALENDAR_LAYOUTS', DEFAULT_CALENDAR_LAYOUTS), settings.STATIC_ROOT)
+
+
+def render_plan(room_type):
+    """Return the compiled plan for a room type."""
+    try:
+        return render_plans()[room_type]
+    except KeyError:
+        raise ValueError(f"Unknown room type '{room_type}'")
+
+
+def room_choices():
+    """Choices for CalendarGeneration.room_type, one per configured layout."""
+    return [(room_type, plan.label) for room_type, plan in render_plans().items()]
+
+
+@receiver(setting_changed)
+def _reset_render_plans(setting, **kwargs):
+    if setting in ('CALENDAR_LAYOUTS', 'STATIC_ROOT'):
+        render_plans.cache_clear()
+
+
+def check_calendar_layouts(app_configs, **kwargs):
+    """System check that compiles the layouts and reports missing or mismatched assets."""
+    try:
+        plans = render_plans()
+    except ImproperlyConfigured as e:
+        return [checks.Error(str(e), id='calendar_generator.E001')]
+
+    # Missing assets are only a warning, since they may not be collected yet
+    warnings = []
+    for room_type, plan in plans.items():
+        problems = plan.asset_problems()
+        if problems:
+            warnings.append(checks.Warning(f"Calendar layout '{room_type}': {'; '.join(problems)}",
+                                           hint="Run collectstatic, or fix CALENDAR_LAYOUTS.",
+                                           id='calendar_generator.W001'))
+    return warnings
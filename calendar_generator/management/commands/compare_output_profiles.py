@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+from datetime import date
+
+import holidays
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from PyPDF2 import PdfMerger
+
+from calendar_generator.layouts import render_plan, room_choices
+from calendar_generator.models import CalendarGeneration
+from calendar_generator.pdf_output import output_profile, output_profiles
+from calendar_generator.views import daterange_to_print, get_printing_end_date, render_pages, year_to_print_for
+
+
+class Command(BaseCommand):
+    help = ('Renders one month and writes it with every output profile, reporting the PDF size and '
+            'page encode time of each')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room-type', type=str, default=None, help='Room type to render (defaults to the first)')
+        parser.add_argument('--month', type=int, default=None, help='Month to render (defaults to next month)')
+        parser.add_argument('--profiles', type=str, default=None,
+                            help='Comma-separated profiles to compare (defaults to all)')
+
+    def handle(self, *args, **options):
+        room_type = options['room_type'] or room_choices()[0][0]
+        if room_type not in dict(room_choices()):
+            raise CommandError(f"Unknown room type '{room_type}', use {', '.join(dict(room_choices()))}")
+        month = options['month'] or (date.today().month % 12) + 1
+        if not 1 <= month <= 12:
+            raise CommandError("--month must be between 1 and 12")
+        year = year_to_print_for(month)
+
+        try:
+            selected = output_profile()
+            profiles = output_profiles()
+            if options['profiles']:
+                profiles = {name: output_profile(name.strip()) for name in options['profiles'].split(',')}
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        month_name = dict(CalendarGeneration.MONTH_CHOICES)[month]
+        days = list(daterange_to_print(date(year, month, 1), get_printing_end_date(month_name, year, month)))
+        plan = render_plan(room_type)
+        self.stdout.write(f"Rendering {len(days)} pages of {plan.label} {month_name} {year}...")
+
+        encode_seconds = {name: 0.0 for name in profiles}
+        with tempfile.TemporaryDirectory() as work_dir:
+            page_paths = {name: {} for name in profiles}
+            michigan_holidays = holidays.US(subdiv="MI", years=year)
+            # Each page is rendered once and then written with every profile
+            for single_date, calendar_sheet in render_pages(days, room_type, michigan_holidays):
+                for name, profile in profiles.items():
+                    page_path = os.path.join(work_dir, f"{name}-{single_date}.pdf")
+                    started = time.perf_counter()
+                    profile.write(calendar_sheet, page_path, plan.page_size)
+                    encode_seconds[name] += time.perf_counter() - started
+                    page_paths[name][single_date] = page_path
+
+            sizes = {}
+            for name in profiles:
+                merger = PdfMerger()
+                for single_date in days:
+                    merger.append(page_paths[name][single_date])
+                merged_path = os.path.join(work_dir, f"{name}.pdf")
+                merger.write(merged_path)
+                merger.close()
+                sizes[name] = os.path.getsize(merged_path)
+
+        self.report(profiles, selected, sizes, encode_seconds, len(days))
+
+    def report(self, profiles, selected, sizes, encode_seconds, pages):
+        largest = max(sizes.values())
+        self.stdout.write('')
+        self.stdout.write(f"  {'profile':<12} {'settings':<36} {'PDF KiB':>9} {'KiB/page':>9} "
+                          f"{'ms/page':>8} {'vs largest':>10}")
+        for name, profile in sorted(profiles.items(), key=lambda item: sizes[item[0]]):
+            marker = '*' if name == selected.name else ' '
+            self.stdout.write(f"{marker} {name:<12} {profile.describe():<36} {sizes[name] / 1024:>9.0f} "
+                              f"{sizes[name] / 1024 / pages:>9.1f} {encode_seconds[name] / pages * 1000:>8.0f} "
+                              f"{sizes[name] / largest:>10.0%}")
+        self.stdout.write('')
+        self.stdout.write(f"* OUTPUT_PROFILE is '{selected.name}'")
@@ -32,10 +32,25 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR("End date must be after start date"))
                 return
 
-            # Check if a holiday with this name and date range already exists
-            if Holiday.objects.filter(name=name, date=start_date, end_date=end_date).exists():
-                self.stdout.write(
-                    self.style.WARNING(f"Holiday already exists: {name} from {start_date} to {end_date}, skipping..."))
+            # Holidays are unique by name and start date, so an existing one is updated rather than duplicated
+            holiday = Holiday.objects.filter(name=name, date=start_date).first()
+            if holiday is not None:
+                changes = {'end_date': end_date, 'is_closed': is_closed}
+                if artwork_path is not None:
+                    changes['artwork_path'] = artwork_path
+                differences = [
+                    f"{field}: {getattr(holiday, field)!r} -> {value!r}"
+                    for field, value in changes.items()
+                    if getattr(holiday, field) != value
+                ]
+                if not differences:
+                    self.stdout.write(
+                        self.style.WARNING(f"Holiday already exists: {name} from {start_date} to {end_date}, skipping..."))
+                    return
+                for field, value in changes.items():
+                    setattr(holiday, field, value)
+                holiday.save()
+                self.stdout.write(self.style.SUCCESS(f"Updated holiday: {name} from {start_date} ({'; '.join(differences)})"))
                 return
 
             # Create the holiday
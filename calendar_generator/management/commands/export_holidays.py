@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from calendar_generator.holiday_files import detect_format, write_csv, write_ics
+from calendar_generator.models import Holiday
+
+
+class Command(BaseCommand):
+    help = 'Exports holidays to a CSV or iCalendar (.ics) file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path of the file to write')
+        parser.add_argument('--format', choices=['csv', 'ics'], default=None,
+                            help='File format (detected from the extension by default)')
+        parser.add_argument('--start', type=str, default=None,
+                            help='Only export holidays ending on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=str, default=None,
+                            help='Only export holidays starting on or before this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+
+        holidays = Holiday.objects.order_by('date', 'name')
+        try:
+            if options['start']:
+                start_date = datetime.strptime(options['start'], "%Y-%m-%d").date()
+                holidays = holidays.filter(Q(date__gte=start_date) | Q(end_date__gte=start_date))
+            if options['end']:
+                end_date = datetime.strptime(options['end'], "%Y-%m-%d").date()
+                holidays = holidays.filter(date__lte=end_date)
+        except ValueError as e:
+            raise CommandError(f"Error processing dates: {e}")
+
+        count = holidays.count()
+        # Stream rows from the database instead of loading every holiday at once
+        rows = holidays.iterator(chunk_size=500)
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as holiday_file:
+                if file_format == 'ics':
+                    write_ics(holiday_file, rows)
+                else:
+                    write_csv(holiday_file, rows)
+        except OSError as e:
+            raise CommandError(f"Could not write {path}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} holidays to {path}"))
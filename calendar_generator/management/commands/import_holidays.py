@@ -0,0 +1,112 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from calendar_generator.holiday_files import READ_ENCODING, HolidayFileError, detect_format, read_csv, read_ics
+from calendar_generator.models import Holiday
+
+# Number of holidays written per INSERT ... ON CONFLICT statement
+BATCH_SIZE = 500
+
+# Fields overwritten when an imported holiday already exists
+UPDATE_FIELDS = ['end_date', 'is_closed', 'artwork_path']
+
+
+class DryRunRollback(Exception):
+    """Raised to roll back the import transaction after a dry run."""
+
+
+class Command(BaseCommand):
+    help = 'Imports holidays from a CSV or iCalendar (.ics) file in a single transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path to the CSV or .ics file')
+        parser.add_argument('--format', choices=['csv', 'ics'], default=None,
+                            help='File format (detected from the extension by default)')
+        parser.add_argument('--closed', action='store_true',
+                            help='Mark imported .ics events as closed unless the file says otherwise')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Show what would change without writing to the database')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        dry_run = options['dry_run']
+
+        counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+        try:
+            with open(path, newline='', encoding=READ_ENCODING) as holiday_file:
+                if file_format == 'ics':
+                    rows = read_ics(holiday_file, default_closed=options['closed'])
+                else:
+                    rows = read_csv(holiday_file)
+
+                with transaction.atomic():
+                    batch = {}
+                    for _, fields in rows:
+                        # The last row wins when a file repeats a holiday
+                        batch[(fields['name'], fields['date'])] = fields
+                        if len(batch) >= BATCH_SIZE:
+                            self.upsert_batch(batch, counts, dry_run)
+                            batch = {}
+                    if batch:
+                        self.upsert_batch(batch, counts, dry_run)
+
+                    if dry_run:
+                        raise DryRunRollback
+        except DryRunRollback:
+            pass
+        except OSError as e:
+            raise CommandError(f"Could not read {path}: {e}")
+        except HolidayFileError as e:
+            raise CommandError(f"Nothing imported. {e}")
+
+        summary = (f"{counts['created']} created, {counts['updated']} updated, "
+                   f"{counts['unchanged']} unchanged")
+        if dry_run:
+            self.stdout.write(self.style.NOTICE(f"Dry run, nothing written: {summary}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Finished! {summary}."))
+
+    def upsert_batch(self, batch, counts, dry_run):
+        """Report the differences for one batch and upsert it with a single query."""
+        dates = {date for _, date in batch}
+        existing = {
+            (holiday.name, holiday.date): holiday
+            for holiday in Holiday.objects.filter(date__in=dates, name__in={name for name, _ in batch})
+        }
+
+        changed = []
+        for key, fields in batch.items():
+            holiday = existing.get(key)
+            if holiday is None:
+                counts['created'] += 1
+                self.stdout.write(self.style.SUCCESS(f"+ {self.describe(fields)}"))
+                changed.append(fields)
+                continue
+
+            differences = [
+                f"{field}: {getattr(holiday, field)!r} -> {fields[field]!r}"
+                for field in UPDATE_FIELDS
+                if getattr(holiday, field) != fields[field]
+            ]
+            if differences:
+                counts['updated'] += 1
+                self.stdout.write(self.style.WARNING(f"~ {self.describe(fields)} ({'; '.join(differences)})"))
+                changed.append(fields)
+            else:
+                counts['unchanged'] += 1
+
+        if changed and not dry_run:
+            Holiday.objects.bulk_create(
+                [Holiday(**fields) for fields in changed],
+                update_conflicts=True,
+                unique_fields=['name', 'date'],
+                # bulk_create only updates the fields listed, so bump updated_at for the holiday index too
+                update_fields=[*UPDATE_FIELDS, 'updated_at'],
+            )
+
+    @staticmethod
+    def describe(fields):
+        if fields['end_date']:
+            return f"{fields['name']} from {fields['date']} to {fields['end_date']}"
+        return f"{fields['name']} on {fields['date']}"
@@ -0,0 +1,304 @@
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date
+from http.cookiejar import CookieJar
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test import Client, override_settings
+
+from calendar_generator import views
+from calendar_generator.layouts import room_choices
+from calendar_generator.models import CalendarGeneration
+
+# Default share of each endpoint in the replayed traffic
+DEFAULT_MIX = 'home=1,download=4,success=4,print=1'
+
+# Status code each endpoint returns when the request succeeded
+EXPECTED_STATUS = {
+    'home': 302,
+    'download': 200,
+    'success': 200,
+    'print': 302,
+}
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def write_stub_calendar(room_type, month, year, progress=None):
+    """Stand in for generate_calendar, writing a placeholder PDF where the calendar would be saved."""
+    output_path = views.calendar_output_path(room_type, month, year)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'wb') as pdf:
+        pdf.write(b'%PDF-1.4\n%%EOF\n')
+    return output_path
+
+
+class FakeLpr:
+    """Stand-in for the lpr command that only pretends to spool the file."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.jobs = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        time.sleep(self.delay)
+        with self.lock:
+            self.jobs += 1
+
+    async def spool_async(self, *args):
+        await asyncio.sleep(self.delay)
+        with self.lock:
+            self.jobs += 1
+
+
+class TestClientTransport:
+    """Send requests through Django's test client, inside this process."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        # Read streamed downloads to the end so they are timed fully
+        if response.streaming:
+            # Iterating the response itself also consumes async iterators
+            for _ in response:
+                pass
+        return response.status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LiveServerTransport:
+    """Send real HTTP requests to a local server, keeping cookies like a browser."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def request(self, path, data=None):
+        try:
+            with self.opener.open(self.base_url + path, data=data) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def get(self, path):
+        return self.request(path)
+
+    def post(self, path, data):
+        csrf_token = next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), None)
+        if csrf_token is None:
+            self.get(path)
+            csrf_token = next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+        body = urllib.parse.urlencode({**data, 'csrfmiddlewaretoken': csrf_token}, doseq=True).encode()
+        return self.request(path, body)
+
+
+class Command(BaseCommand):
+    help = ('Replays a mix of home, download, success and print requests against a throwaway database '
+            'and reports throughput and latency per endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Total number of requests to send')
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of simulated users sending requests')
+        parser.add_argument('--mix', type=str, default=DEFAULT_MIX,
+                            help=f'Relative weight of each endpoint (default: {DEFAULT_MIX})')
+        parser.add_argument('--month', type=int, default=None,
+                            help='Month to generate calendars for (defaults to next month)')
+        parser.add_argument('--live-server', action='store_true',
+                            help='Serve the site on a local port and send real HTTP requests instead of '
+                                 'using the test client')
+        parser.add_argument('--stub-render', action='store_true',
+                            help='Replace calendar rendering with a tiny PDF to measure request overhead only')
+        parser.add_argument('--print-delay', type=float, default=0.05,
+                            help='Seconds the fake lpr command takes to spool a job')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for a reproducible request order')
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1")
+        month = options['month'] or (date.today().month % 12) + 1
+        if not 1 <= month <= 12:
+            raise CommandError("--month must be between 1 and 12")
+
+        # Run against a scratch database and media directory so real data is never touched
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root,
+                                      ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+                    mock.patch.object(views, 'sh', views.sh or True), \
+                    mock.patch.object(views, 'lpr', FakeLpr(options['print_delay'])) as fake_lpr, \
+                    mock.patch.object(views, 'lpr_async', fake_lpr.spool_async):
+                if options['stub_render']:
+                    with mock.patch.object(views, 'generate_calendar', write_stub_calendar):
+                        results, elapsed = self.run_load(mix, month, options)
+                else:
+                    results, elapsed = self.run_load(mix, month, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.report(results, elapsed)
+        self.stdout.write(f"Fake lpr received {fake_lpr.jobs} print jobs.")
+
+    @staticmethod
+    def parse_mix(value):
+        mix = {}
+        for part in value.split(','):
+            endpoint, _, weight = part.partition('=')
+            endpoint = endpoint.strip()
+            if endpoint not in EXPECTED_STATUS:
+                raise CommandError(f"Unknown endpoint '{endpoint}' in --mix, use {', '.join(EXPECTED_STATUS)}")
+            try:
+                mix[endpoint] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f"Invalid weight '{weight}' for {endpoint} in --mix")
+        if not any(mix.values()):
+            raise CommandError("--mix needs at least one endpoint with a positive weight")
+        return mix
+
+    def run_load(self, mix, month, options):
+        """Send the requests and return ({endpoint: [(seconds, ok), ...]}, elapsed seconds)."""
+        server = None
+        if options['live_server']:
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+            def make_transport():
+                return LiveServerTransport(base_url)
+        else:
+            make_transport = TestClientTransport
+
+        try:
+            # Download, success and print need calendars to exist before the clock starts
+            self.stdout.write("Generating seed calendars...")
+            seed_transport = make_transport()
+            for room_type, _ in room_choices():
+                seed_transport.post('/', {'room_type': room_type, 'month': month})
+            # Calendars render in the background, so wait for the seeds to finish
+            while CalendarGeneration.objects.filter(status__in=['pending', 'running']).exists():
+                time.sleep(0.1)
+            calendar_ids = list(CalendarGeneration.objects.filter(status='done').values_list('id', flat=True))
+            if not calendar_ids:
+                raise CommandError("Seed calendars could not be generated, check that the static files are collected")
+
+            rng = random.Random(options['seed'])
+            endpoints = rng.choices(list(mix), weights=list(mix.values()), k=options['requests'])
+            plan = [(endpoint, rng.choice(calendar_ids), rng.choice(room_choices())[0])
+                    for endpoint in endpoints]
+
+            results = {endpoint: [] for endpoint in mix}
+            lock = threading.Lock()
+            plan_iter = iter(plan)
+
+            def user():
+                transport = make_transport()
+                try:
+                    while True:
+                        with lock:
+                            item = next(plan_iter, None)
+                        if item is None:
+                            return
+                        endpoint, calendar_id, room_type = item
+                        started = time.perf_counter()
+                        try:
+                            status = self.send(transport, endpoint, calendar_id, room_type, month)
+                        except Exception:
+                            status = None
+                        duration = time.perf_counter() - started
+                        with lock:
+                            results[endpoint].append((duration, status == EXPECTED_STATUS[endpoint]))
+                finally:
+                    connection.close()
+
+            self.stdout.write(f"Sending {len(plan)} requests from {options['concurrency']} users...")
+            started = time.perf_counter()
+            users = [threading.Thread(target=user) for _ in range(options['concurrency'])]
+            for thread in users:
+                thread.start()
+            for thread in users:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            # home only queues a render, so also report how long the queued renders took to drain
+            while CalendarGeneration.objects.filter(status__in=['pending', 'running']).exists():
+                time.sleep(0.1)
+            drained = time.perf_counter() - started
+            failed = CalendarGeneration.objects.exclude(status='done').count()
+            generated = CalendarGeneration.objects.count() - len(calendar_ids)
+            self.stdout.write(f"{generated} background generations finished {drained:.2f}s after the first "
+                              f"request ({failed} failed).")
+            return results, elapsed
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+    @staticmethod
+    def send(transport, endpoint, calendar_id, room_type, month):
+        match endpoint:
+            case 'home':
+                return transport.post('/', {'room_type': room_type, 'month': month})
+            case 'download':
+                return transport.get(f'/download/{calendar_id}/')
+            case 'success':
+                return transport.get(f'/success/{calendar_id}/')
+            case 'print':
+                return transport.get(f'/print/{calendar_id}/')
+
+    def report(self, results, elapsed):
+        total = sum(len(samples) for samples in results.values())
+        self.stdout.write('')
+        self.stdout.write(f"{'endpoint':<10} {'requests':>8} {'errors':>7} {'err %':>6} "
+                          f"{'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for endpoint, samples in results.items():
+            durations = sorted(duration for duration, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+            error_rate = 100 * errors / len(samples) if samples else 0.0
+            line = (f"{endpoint:<10} {len(samples):>8} {errors:>7} {error_rate:>6.1f} "
+                    f"{len(samples) / elapsed:>7.2f} {percentile(durations, 50) * 1000:>8.1f} "
+                    f"{percentile(durations, 95) * 1000:>8.1f} {percentile(durations, 99) * 1000:>8.1f}")
+            self.stdout.write(self.style.ERROR(line) if errors else line)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} requests in {elapsed:.2f}s: {total / elapsed:.2f} requests/s, "
+            f"{total / elapsed * 60:.0f} requests/minute"))
@@ -0,0 +1,75 @@
+import os
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from calendar_generator.layouts import room_choices
+from calendar_generator.models import CalendarGeneration
+from calendar_generator.views import calendar_output_path, generate_calendar_once, upcoming_months
+
+
+class Command(BaseCommand):
+    help = ('Pre-generates the upcoming months for every room type during quiet hours, '
+            'so the first request for them is served from the cache')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=2,
+                            help='Number of upcoming months to generate, starting with next month')
+        parser.add_argument('--quiet-hours', type=str, default='22-6',
+                            help='Hours of the day (START-END, 24-hour clock) during which rendering may run')
+        parser.add_argument('--now', action='store_true', help='Ignore the quiet hours and render immediately')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and re-check every --interval seconds, re-rendering after holiday edits')
+        parser.add_argument('--interval', type=int, default=300, help='Seconds between checks with --loop')
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError("--months must be at least 1")
+        try:
+            start_hour, end_hour = (int(hour) for hour in options['quiet_hours'].split('-'))
+        except ValueError:
+            raise CommandError("--quiet-hours must look like 22-6")
+        if not (0 <= start_hour <= 23 and 0 <= end_hour <= 23):
+            raise CommandError("--quiet-hours must use hours between 0 and 23")
+
+        while True:
+            if options['now'] or self.in_quiet_hours(datetime.now().hour, start_hour, end_hour):
+                self.warm(options['months'])
+            elif not options['loop']:
+                self.stdout.write(self.style.WARNING(
+                    f"Outside quiet hours ({options['quiet_hours']}), nothing rendered. Use --now to render anyway."))
+
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def in_quiet_hours(hour, start_hour, end_hour):
+        if start_hour <= end_hour:
+            return start_hour <= hour < end_hour
+        # The quiet hours wrap around midnight
+        return hour >= start_hour or hour < end_hour
+
+    def warm(self, months):
+        """Render every room type for the upcoming months, skipping calendars that are up to date."""
+        for month, year in upcoming_months(months):
+            for room_type, room_label in room_choices():
+                month_name = dict(CalendarGeneration.MONTH_CHOICES)[month]
+                output_path = calendar_output_path(room_type, month, year)
+                previous_mtime = os.path.getmtime(output_path) if os.path.exists(output_path) else None
+
+                started = time.perf_counter()
+                try:
+                    generate_calendar_once(room_type, month, year)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Error generating {room_label} {month_name} {year}: {e}"))
+                    continue
+
+                if os.path.getmtime(output_path) != previous_mtime:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Generated {room_label} {month_name} {year} in {time.perf_counter() - started:.1f}s"))
+                else:
+                    self.stdout.write(f"{room_label} {month_name} {year} is up to date")
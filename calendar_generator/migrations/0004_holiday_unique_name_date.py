@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:54
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_holidays(apps, schema_editor):
+    """
+    Merge holidays sharing a name and start date into the oldest row, so the constraint can be added.
+
+    The merged holiday runs to the latest end date, is closed if any duplicate was,
+    and keeps the first artwork found.
+    """
+    Holiday = apps.get_model('calendar_generator', 'Holiday')
+    duplicated = (Holiday.objects.values('name', 'date')
+                  .annotate(rows=Count('id')).filter(rows__gt=1))
+    for key in duplicated:
+        kept, *duplicates = Holiday.objects.filter(name=key['name'], date=key['date']).order_by('id')
+        for duplicate in duplicates:
+            if duplicate.end_date and (kept.end_date is None or duplicate.end_date > kept.end_date):
+                kept.end_date = duplicate.end_date
+            kept.is_closed = kept.is_closed or duplicate.is_closed
+            kept.artwork_path = kept.artwork_path or duplicate.artwork_path
+            kept.artwork_id = kept.artwork_id or duplicate.artwork_id
+        kept.save()
+        Holiday.objects.filter(id__in=[duplicate.id for duplicate in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_generator', '0003_artworkoverlay_holiday_artwork'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_holidays, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='holiday',
+            constraint=models.UniqueConstraint(fields=('name', 'date'), name='unique_holiday_name_date'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:08
+
+from django.db import migrations, models
+
+
+def mark_existing_calendars_done(apps, schema_editor):
+    """Calendars generated before progress tracking already have their PDF."""
+    CalendarGeneration = apps.get_model('calendar_generator', 'CalendarGeneration')
+    CalendarGeneration.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True).update(status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_generator', '0004_holiday_unique_name_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='pages_done',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='seconds_per_page',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='total_pages',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(mark_existing_calendars_done, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:15
+
+import calendar_generator.layouts
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_generator', '0005_calendargeneration_progress'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='calendargeneration',
+            name='room_type',
+            field=models.CharField(choices=calendar_generator.layouts.room_choices, max_length=10),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_generator', '0006_calendargeneration_room_type_registry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='holiday',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='holiday',
+            index=models.Index(fields=['date', 'end_date'], name='holiday_date_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='holiday',
+            index=models.Index(fields=['end_date', 'date'], name='holiday_end_date_date_idx'),
+        ),
+    ]
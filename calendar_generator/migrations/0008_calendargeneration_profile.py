@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_generator', '0007_holiday_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='profile_stacks',
+            field=models.FileField(blank=True, null=True, upload_to='profiles/'),
+        ),
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='profile_stats',
+            field=models.FileField(blank=True, null=True, upload_to='profiles/'),
+        ),
+    ]
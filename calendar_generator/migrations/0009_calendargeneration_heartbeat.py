@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_generator', '0008_calendargeneration_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendargeneration',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
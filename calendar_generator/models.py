@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils import timezone
 
+from .layouts import room_choices
+
 
 class ArtworkOverlay(models.Model):
     """Model representing an artwork overlay that can be applied to calendars."""
@@ -23,6 +25,20 @@ class Holiday(models.Model):
     artwork_path = models.CharField(max_length=255, blank=True, null=True)
     artwork = models.ForeignKey(ArtworkOverlay, on_delete=models.SET_NULL, blank=True, null=True, 
                                help_text="Artwork overlay to use for this holiday")
+    # Tells the in-process holiday index when to rebuild. QuerySet.update() leaves auto_now fields alone,
+    # so bulk updates must set it explicitly
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # Lets bulk imports upsert on (name, date) instead of querying row by row, and serves lookups by name
+            models.UniqueConstraint(fields=['name', 'date'], name='unique_holiday_name_date'),
+        ]
+        indexes = [
+            # Exact date lookups, and range lookups from either end
+            models.Index(fields=['date', 'end_date'], name='holiday_date_end_date_idx'),
+            models.Index(fields=['end_date', 'date'], name='holiday_end_date_date_idx'),
+        ]
 
     def __str__(self):
         if self.end_date and self.end_date != self.date:
@@ -32,11 +48,6 @@ class Holiday(models.Model):
 
 class CalendarGeneration(models.Model):
     """Model representing a calendar generation job."""
-    ROOM_CHOICES = [
-        ('study', 'Study Room'),
-        ('program', 'Program Room'),
-    ]
-
     MONTH_CHOICES = [
         (1, 'January'),
         (2, 'February'),
@@ -52,13 +63,36 @@ class CalendarGeneration(models.Model):
         (12, 'December'),
     ]
 
-    room_type = models.CharField(max_length=10, choices=ROOM_CHOICES)
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    # Room types come from the CALENDAR_LAYOUTS registry, so adding one needs no migration
+    room_type = models.CharField(max_length=10, choices=room_choices)
     month = models.IntegerField(choices=MONTH_CHOICES)
     year = models.IntegerField()
     created_at = models.DateTimeField(default=timezone.now)
     pdf_file = models.FileField(upload_to='calendars/', blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    pages_done = models.IntegerField(default=0)
+    total_pages = models.IntegerField(default=0)
+    seconds_per_page = models.FloatField(blank=True, null=True)
+    cancel_requested = models.BooleanField(default=False)
+    error = models.TextField(blank=True, null=True)
+    # Set while a worker has the generation queued or running, so ones lost to a restart can be failed
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    # Set when staff asked for the render to be profiled, see calendar_generator/profiling.py
+    profile_stats = models.FileField(upload_to='profiles/', blank=True, null=True)
+    profile_stacks = models.FileField(upload_to='profiles/', blank=True, null=True)
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
 
     def __str__(self):
         month_name = dict(self.MONTH_CHOICES)[self.month]
-        room_type_name = dict(self.ROOM_CHOICES)[self.room_type]
-        return f"{room_type_name} Calendar - {month_name} {self.year}"
+        return f"{self.get_room_type_display()} Calendar - {month_name} {self.year}"
@@ -0,0 +1,32 @@
+"""
+Output profiles for the PDF pages of a calendar.
+
+A profile sets the resolution, color mode and compression that pages are written
+with. Profiles come from the OUTPUT_PROFILES setting, falling back to
+DEFAULT_OUTPUT_PROFILES, and OUTPUT_PROFILE picks the one calendars are generated with.
+OutputProfile and the PDF writing itself are in engine.py.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .engine import DEFAULT_OUTPUT_PROFILES, ConfigurationError, OutputProfile
+
+DEFAULT_OUTPUT_PROFILE = 'print'
+
+
+def output_profiles():
+    """Return {name: OutputProfile} for the configured profiles."""
+    profiles = getattr(settings, 'OUTPUT_PROFILES', DEFAULT_OUTPUT_PROFILES)
+    try:
+        return {name: OutputProfile(name, **options) for name, options in profiles.items()}
+    except (ConfigurationError, TypeError) as e:
+        raise ImproperlyConfigured(f"invalid OUTPUT_PROFILES: {e}")
+
+
+def output_profile(name=None):
+    """Return the named profile, or the one OUTPUT_PROFILE selects."""
+    name = name or getattr(settings, 'OUTPUT_PROFILE', DEFAULT_OUTPUT_PROFILE)
+    profiles = output_profiles()
+    if name not in profiles:
+        raise ImproperlyConfigured(f"unknown output profile '{name}', use {', '.join(profiles)}")
+    return profiles[name]
@@ -0,0 +1,80 @@
+"""
+On-demand profiling of a single calendar render.
+
+capture_profile runs a block under cProfile, and meanwhile samples the call stack
+of the profiled thread. It saves the cProfile stats (open them with pstats or
+snakeviz) and the samples as collapsed stacks, one "frame;frame;frame count" line per
+distinct stack, which flamegraph.pl and speedscope read directly. Nothing here runs
+unless a profile is asked for.
+"""
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Seconds between stack samples
+STACK_SAMPLE_INTERVAL = 0.002
+
+
+class StackSampler:
+    """Count the call stacks of one thread, sampled from a background thread."""
+
+    def __init__(self, thread_id, interval=STACK_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as stacks_file:
+            for stack, count in sorted(self.counts.items()):
+                stacks_file.write(f"{stack} {count}\n")
+
+
+def frame_label(frame):
+    """Name a frame as module:qualified_name, without the spaces and semicolons collapsed stacks reserve."""
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}:{frame.f_code.co_qualname}".replace(' ', '_').replace(';', ':')
+
+
+@contextmanager
+def capture_profile(output_base):
+    """
+    Profile the block, saving ``output_base + '.pstats'`` and ``output_base + '.collapsed'``.
+
+    Both files are written even when the block raises, so failed renders can be
+    profiled too. Yields (stats_path, stacks_path).
+    """
+    os.makedirs(os.path.dirname(output_base), exist_ok=True)
+    stats_path, stacks_path = f"{output_base}.pstats", f"{output_base}.collapsed"
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield stats_path, stacks_path
+    finally:
+        profiler.disable()
+        sampler.stop()
+        profiler.dump_stats(stats_path)
+        sampler.write(stacks_path)
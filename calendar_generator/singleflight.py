@@ -0,0 +1,121 @@
+"""Coalesce identical concurrent calls so that only one of them does the work."""
+import os
+import threading
+from contextlib import contextmanager
+
+# fcntl is only available on Unix; elsewhere calls are only coalesced within one process.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time and share its result with every caller.
+
+    Threads in the same process that ask for a key already in flight wait for the
+    running call and receive its result (or exception). When ``lock_path`` is given,
+    callers in different processes are also serialised with an exclusive lock on that
+    file, so ``func`` should reuse a result another process finished while it waited.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, lock_path=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with process_lock(lock_path):
+                call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+@contextmanager
+def process_lock(lock_path):
+    """Hold an exclusive lock on ``lock_path``, shared by every process on this machine."""
+    if lock_path is None or fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SharedProgress:
+    """
+    Fan the progress of a shared call out to every caller waiting on it.
+
+    Each caller registers its own progress callback for the key with ``listen``
+    before joining the call, and the call reports through ``reporter(key)``. A
+    callback that raises is dropped, as that caller no longer wants the result; once
+    every caller's callback has raised, the last exception propagates and stops the
+    shared call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = {}
+
+    @contextmanager
+    def listen(self, key, progress):
+        with self._lock:
+            self._listeners.setdefault(key, []).append(progress)
+        try:
+            yield
+        finally:
+            with self._lock:
+                listeners = self._listeners.get(key, [])
+                if progress in listeners:
+                    listeners.remove(progress)
+                if not listeners:
+                    self._listeners.pop(key, None)
+
+    def reporter(self, key):
+        """Return a progress callback that calls every callback registered for ``key``."""
+        def report(*args):
+            with self._lock:
+                listeners = list(self._listeners.get(key, []))
+            for progress in listeners:
+                try:
+                    progress(*args)
+                except BaseException:
+                    with self._lock:
+                        remaining = self._listeners.get(key, [])
+                        if progress in remaining:
+                            remaining.remove(progress)
+                        if remaining:
+                            continue
+                    raise
+        return report
@@ -1 +1,1253 @@
-# Create your tests here.
+import codecs
+import importlib
+import io
+import json
+import os
+import pstats
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import holidays
+from asgiref.sync import async_to_sync
+from PIL import Image, ImageChops, ImageDraw, ImageFont, ImageStat
+from PyPDF2 import PdfReader
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, close_old_connections, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import clear_url_caches, reverse
+from django.utils import timezone
+
+from . import engine, urls, views
+from .compositing import np
+from .engine import CLOSED_TODAY, ConfigurationError
+from .holiday_files import READ_ENCODING, HolidayFileError, read_csv, read_ics, write_ics
+from .management.commands import loadtest, pregenerate_calendars
+from .management.commands.loadtest import write_stub_calendar
+from .layouts import DEFAULT_CALENDAR_LAYOUTS, compile_layouts, render_plan, room_choices
+from .models import ArtworkOverlay, CalendarGeneration, Holiday
+from .pdf_output import DEFAULT_OUTPUT_PROFILES, OutputProfile, output_profiles
+
+try:
+    from typer.testing import CliRunner
+
+    from . import cli
+except ImportError:
+    # The command line renderer needs typer and rich, which the web app doesn't
+    cli = None
+
+
+class MediaRootMixin:
+    """Give every test its own empty MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class SQLiteConcurrencyTests(MediaRootMixin, TransactionTestCase):
+    """Hammer calendar generation and holiday reads from many threads at once."""
+    THREADS = 12
+    REQUESTS_PER_THREAD = 15
+
+    def setUp(self):
+        super().setUp()
+        Holiday.objects.create(name="Spring Break", date=date(2025, 3, 15), end_date=date(2025, 3, 22), is_closed=True)
+        Holiday.objects.create(name="Independence Day", date=date(2025, 7, 4), is_closed=True)
+
+    def test_database_profile(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            # 1 is NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_concurrent_generations_and_holiday_reads(self):
+        errors = []
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(thread_number):
+            client = Client()
+            try:
+                for i in range(self.REQUESTS_PER_THREAD):
+                    started = time.perf_counter()
+                    if (thread_number + i) % 2:
+                        response = client.post('/', {'room_type': 'study', 'month': (i % 12) + 1})
+                        if response.status_code != 302:
+                            errors.append(f"home returned {response.status_code}")
+                    else:
+                        views.get_holiday_info("Independence Day", "2025-03-18")
+                        views.get_holiday_info(None, "2025-03-18")
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            except OperationalError as e:
+                errors.append(str(e))
+            finally:
+                close_old_connections()
+                connection.close()
+
+        render_pool = ThreadPoolExecutor(max_workers=4)
+        # Stand in for the image rendering so the test only measures database contention
+        with mock.patch.object(views, 'generate_calendar', write_stub_calendar), \
+                mock.patch.object(views, '_render_executor', render_pool), \
+                mock.patch.object(views, 'print', create=True) as print_mock:
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.THREADS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Let the background generations write their results too
+            render_pool.shutdown(wait=True)
+
+        # get_holiday_info swallows database errors and prints them
+        errors.extend(str(call.args[0]) for call in print_mock.call_args_list)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(latencies), self.THREADS * self.REQUESTS_PER_THREAD)
+        self.assertEqual(CalendarGeneration.objects.count(), self.THREADS * self.REQUESTS_PER_THREAD // 2)
+        self.assertEqual(list(CalendarGeneration.objects.exclude(status='done').values_list('status', 'error')), [])
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)]
+        self.assertLess(p95, 2.0, f"p95 latency {p95:.3f}s, median {statistics.median(latencies):.3f}s")
+
+
+def default_date_font(font_path, size):
+    """Pillow's bundled font, so rendering tests don't need the collected SF Pro font."""
+    return ImageFont.load_default(size=size)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+@override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0])
+@mock.patch.object(engine, 'date_font', default_date_font)
+class BatchCompositingTests(TestCase):
+    """The NumPy backend must produce the same pages as the PIL backend."""
+    # Friday, Saturday, Sunday and a Monday holiday with artwork that is also closed
+    DAYS = [date(2025, 3, 7), date(2025, 3, 8), date(2025, 3, 9), date(2025, 3, 10)]
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+
+        # Semi-transparent artwork that also covers the date in the top right corner
+        width, height = Image.open(os.path.join(settings.STATICFILES_DIRS[0], CLOSED_TODAY)).size
+        artwork = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        artwork.paste((200, 30, 90, 140), (width // 2, 0, width, height // 3))
+        artwork.paste((20, 160, 40, 255), (100, height // 2, 600, height // 2 + 400))
+        self.artwork_path = os.path.join(self.work_dir.name, 'artwork.png')
+        artwork.save(self.artwork_path)
+
+        Holiday.objects.create(name="Test Day", date=date(2025, 3, 10), is_closed=True, artwork_path=self.artwork_path)
+        self.michigan_holidays = holidays.US(subdiv="MI", years=2025)
+
+    def render_with_pil(self, single_date, room_type):
+        calendar_sheet = views.standard_week(single_date, room_type)
+        plan = render_plan(room_type)
+        views.draw_dates(calendar_sheet, single_date, plan)
+        holiday_artwork, should_show_closed = views.day_overlays(single_date, room_type, self.michigan_holidays)
+        calendar_sheet = views.overlays(calendar_sheet, os.path.join(self.work_dir.name, 'page.png'),
+                                        holiday_artwork, plan.closed_overlay if should_show_closed else None)
+        return calendar_sheet.convert("RGB")
+
+    def test_batch_pages_match_pil_pages(self):
+        for room_type in ('study', 'program'):
+            pages = dict(views.render_pages_batched(self.DAYS, room_type, self.michigan_holidays))
+            self.assertEqual(sorted(pages), self.DAYS)
+
+            for single_date in self.DAYS:
+                with self.subTest(room_type=room_type, date=single_date):
+                    expected = np.asarray(self.render_with_pil(single_date, room_type), dtype=np.int16)
+                    actual = np.asarray(pages[single_date], dtype=np.int16)
+                    self.assertEqual(actual.shape, expected.shape)
+                    difference = np.abs(actual - expected)
+                    self.assertLessEqual(difference.max(), 2)
+                    self.assertLess(difference.mean(), 0.05)
+
+
+class SingleFlightGenerationTests(MediaRootMixin, TransactionTestCase):
+    """Identical concurrent requests must share one render."""
+
+    def setUp(self):
+        super().setUp()
+        self.renders = 0
+        self.lock = threading.Lock()
+
+    def fake_generate_calendar(self, room_type, month, year, progress=None):
+        with self.lock:
+            self.renders += 1
+        # Stay in flight long enough for the other threads to pile up behind this render
+        time.sleep(0.3)
+        return write_stub_calendar(room_type, month, year)
+
+    def generate_concurrently(self, count):
+        results = []
+
+        def worker():
+            try:
+                results.append(views.generate_calendar_once('study', 3, 2025))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_identical_requests_share_one_render(self):
+        with mock.patch.object(views, 'generate_calendar', self.fake_generate_calendar):
+            results = self.generate_concurrently(8)
+            self.assertEqual(self.renders, 1)
+            self.assertEqual(len(set(results)), 1)
+            self.assertEqual(len(results), 8)
+
+            # A finished calendar is reused until its holiday plan changes
+            views.generate_calendar_once('study', 3, 2025)
+            self.assertEqual(self.renders, 1)
+
+            Holiday.objects.create(name="Staff Day", date=date(2025, 3, 12), is_closed=True)
+            self.generate_concurrently(4)
+            self.assertEqual(self.renders, 2)
+
+
+def wait_for_calls(function_mock, count, timeout=5):
+    """Wait until a mock submitted to the render pool has been called ``count`` times."""
+    deadline = time.monotonic() + timeout
+    while function_mock.call_count < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class GenerationLifecycleTests(MediaRootMixin, TransactionTestCase):
+    """Background generations share progress and cancellation, and are failed when their worker is lost."""
+
+    def setUp(self):
+        super().setUp()
+        self.proceed = threading.Event()
+        self.pages_rendered = 0
+
+    def fake_generate_calendar(self, room_type, month, year, progress=None):
+        for page in range(1, 7):
+            self.pages_rendered = page
+            progress(page, 6, 0.01)
+            # Hold the render after its first page until the test has set up the other requests
+            self.proceed.wait(5)
+        return write_stub_calendar(room_type, month, year)
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def share_render(self, cancelled):
+        """Run two requests for the same calendar, cancelling those in ``cancelled`` once both share the render."""
+        calendars = [CalendarGeneration.objects.create(room_type='study', month=3, year=2025) for _ in range(2)]
+        threads = [threading.Thread(target=views.run_generation, args=[calendar.id]) for calendar in calendars]
+        with mock.patch.object(views, 'generate_calendar', self.fake_generate_calendar):
+            threads[0].start()
+            self.wait_for(lambda: self.pages_rendered == 1)
+            threads[1].start()
+            self.wait_for(lambda: sum(map(len, views._generation_progress._listeners.values())) == 2)
+            CalendarGeneration.objects.filter(id__in=[calendars[index].id for index in cancelled]) \
+                .update(cancel_requested=True)
+            self.proceed.set()
+            for thread in threads:
+                thread.join()
+        return [CalendarGeneration.objects.get(id=calendar.id) for calendar in calendars]
+
+    def test_every_request_sharing_a_render_sees_its_progress(self):
+        first, second = self.share_render(cancelled=[0])
+        # Cancelling the request that started the render leaves it running for the other one
+        self.assertEqual(self.pages_rendered, 6)
+        self.assertEqual((first.status, second.status), ('cancelled', 'done'))
+        self.assertEqual((second.pages_done, second.total_pages), (6, 6))
+        self.assertIsNotNone(second.heartbeat_at)
+
+    def test_render_stops_once_every_sharing_request_is_cancelled(self):
+        first, second = self.share_render(cancelled=[0, 1])
+        self.assertEqual(self.pages_rendered, 2)
+        self.assertEqual((first.status, second.status), ('cancelled', 'cancelled'))
+
+    def test_generations_lost_by_their_worker_are_failed(self):
+        long_ago = timezone.now() - timedelta(seconds=views.GENERATION_STALE_AFTER + 60)
+        lost_running = CalendarGeneration.objects.create(room_type='study', month=3, year=2025, status='running',
+                                                         heartbeat_at=long_ago)
+        lost_pending = CalendarGeneration.objects.create(room_type='study', month=4, year=2025, created_at=long_ago)
+        alive = CalendarGeneration.objects.create(room_type='study', month=5, year=2025, status='running',
+                                                  created_at=long_ago, heartbeat_at=timezone.now())
+
+        response = Client().get(reverse('calendar_success', args=[lost_running.id]))
+        self.assertContains(response, views.STALE_GENERATION_ERROR)
+        # Running a generation fails the rest
+        started = CalendarGeneration.objects.create(room_type='study', month=6, year=2025)
+        with mock.patch.object(views, 'generate_calendar_once',
+                               return_value=os.path.join(settings.MEDIA_ROOT, 'calendars', 'June.pdf')):
+            views.start_generation(started.id).result()
+        self.assertEqual([CalendarGeneration.objects.get(id=calendar.id).status
+                          for calendar in (lost_running, lost_pending, alive, started)],
+                         ['failed', 'failed', 'running', 'done'])
+
+    def test_async_home_starts_a_generation_from_the_event_loop(self):
+        use_async_views(self)
+        with mock.patch.object(views, 'run_generation') as run_generation:
+            response = async_to_sync(AsyncClient().post)('/', {'room_type': 'study', 'month': 3})
+            wait_for_calls(run_generation, 1)
+        calendar = CalendarGeneration.objects.get()
+        self.assertEqual(response.url, reverse('calendar_success', args=[calendar.id]))
+        run_generation.assert_called_once_with(calendar.id, False)
+
+    def test_sync_progress_stream_ends_for_the_browser_to_reconnect(self):
+        calendar = CalendarGeneration.objects.create(room_type='study', month=3, year=2025, status='running',
+                                                     heartbeat_at=timezone.now())
+        started = time.monotonic()
+        with mock.patch.object(views, 'PROGRESS_LONG_POLL_TIMEOUT', 0.3):
+            response = Client().get(reverse('calendar_progress', args=[calendar.id]))
+            events = b''.join(response.streaming_content).decode()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertTrue(events.startswith(f"retry: {views.PROGRESS_RETRY_INTERVAL * 1000}\n\n"))
+        self.assertEqual(events.count('event: progress'), 1)
+
+        # A generation whose worker is gone is reported as failed rather than followed
+        CalendarGeneration.objects.filter(id=calendar.id).update(
+            heartbeat_at=timezone.now() - timedelta(seconds=views.GENERATION_STALE_AFTER + 60))
+        events = ''.join(views.progress_events(calendar.id))
+        self.assertIn('"status": "failed"', events)
+
+
+class LayoutRegistryTests(TestCase):
+    """Room types and their layouts come from CALENDAR_LAYOUTS."""
+    TEEN_LAYOUT = {
+        'label': 'Teen Room',
+        'templates': {'default': "images/SR_0_Asset_WeekdayHours.png", 'sunday': "images/SR_3_Asset_SundayHours.png"},
+        'date_text': {'position': (3000, 200), 'size': 60},
+        'closed_overlay': CLOSED_TODAY,
+        'closed_weekdays': ['saturday', 'sunday'],
+    }
+
+    def test_default_layouts_match_the_templates(self):
+        plan = render_plan('study')
+        # Friday, Saturday, Sunday, Monday
+        templates = [os.path.basename(plan.template_for(date(2025, 3, day))) for day in (7, 8, 9, 10)]
+        self.assertEqual(templates, ['SR_1_Asset_FridayHours.png', 'SR_2_Asset_SaturdayHours.png',
+                                     'SR_3_Asset_SundayHours.png', 'SR_0_Asset_WeekdayHours.png'])
+        self.assertEqual(plan.date_position, (3274, 114))
+
+        with override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0]):
+            for plan in compile_layouts(DEFAULT_CALENDAR_LAYOUTS, settings.STATIC_ROOT).values():
+                self.assertEqual(plan.asset_problems(), [])
+
+    def test_new_room_type_needs_no_code_changes(self):
+        with override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0],
+                               CALENDAR_LAYOUTS={**DEFAULT_CALENDAR_LAYOUTS, 'teen': self.TEEN_LAYOUT}):
+            self.assertIn(('teen', 'Teen Room'), room_choices())
+            plan = render_plan('teen')
+            self.assertEqual((plan.date_position, plan.date_size), ((3000, 200), 60))
+            self.assertTrue(plan.is_closed_weekday(date(2025, 3, 8)))
+            self.assertFalse(plan.is_closed_weekday(date(2025, 3, 7)))
+            # Raises ValidationError if the model does not accept the new room type
+            CalendarGeneration(room_type='teen', month=3, year=2025).full_clean()
+        self.assertNotIn('teen', dict(room_choices()))
+
+    def test_incomplete_layout_is_rejected(self):
+        layout = {**self.TEEN_LAYOUT, 'templates': {'sunday': "images/SR_3_Asset_SundayHours.png"}}
+        with self.assertRaisesMessage(ImproperlyConfigured, "no template for monday"):
+            compile_layouts({'teen': layout}, settings.STATIC_ROOT)
+
+
+class OutputProfileTests(TestCase):
+    """Every output profile must write a readable Letter-sized page."""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+        # A flat-color sheet with some text, like the calendar templates
+        self.page = Image.new("RGB", (3546, 2740), (250, 244, 230))
+        self.page.paste((30, 90, 160), (0, 0, 3546, 400))
+        ImageDraw.Draw(self.page).text((200, 1200), "Open 9 AM - 9 PM", (0, 0, 0), font=ImageFont.load_default(size=160))
+
+    def test_profiles_write_letter_pages(self):
+        sizes = {}
+        for name, profile in output_profiles().items():
+            with self.subTest(profile=name):
+                path = os.path.join(self.work_dir.name, f"{name}.pdf")
+                profile.write(self.page, path, (11, 8.5))
+                sizes[name] = os.path.getsize(path)
+
+                page = PdfReader(path).pages[0]
+                self.assertEqual([round(float(value)) for value in page.mediabox], [0, 0, 792, 612])
+                image = next(iter(page['/Resources']['/XObject'].values())).get_object()
+                expected_width = profile.dpi * 11 if profile.dpi else self.page.width
+                self.assertEqual(image['/Width'], expected_width)
+
+        self.assertLess(sizes['print'], sizes['original'] / 2)
+        self.assertLess(sizes['screen'], sizes['original'] / 2)
+
+    def test_palette_page_keeps_its_colors(self):
+        path = os.path.join(self.work_dir.name, "page.pdf")
+        OutputProfile('test', color='palette', colors=16).write(self.page, path, (11, 8.5))
+
+        image = PdfReader(path).pages[0]['/Resources']['/XObject']['/Im0'].get_object()
+        decoded = Image.frombytes("P", (image['/Width'], image['/Height']), image.get_data())
+        decoded.putpalette(image['/ColorSpace'][3])
+        decoded = decoded.convert("RGB")
+        # The octree quantizer may round a color by a step
+        for position, color in (((10, 10), (30, 90, 160)), ((3000, 2500), (250, 244, 230))):
+            for actual, expected in zip(decoded.getpixel(position), color):
+                self.assertAlmostEqual(actual, expected, delta=2)
+
+    def test_invalid_profile_is_rejected(self):
+        with self.assertRaises(ConfigurationError):
+            OutputProfile('bad', color='palette', compression='jpeg')
+        with override_settings(OUTPUT_PROFILES={**DEFAULT_OUTPUT_PROFILES, 'bad': {'dpi': 0}}):
+            with self.assertRaises(ImproperlyConfigured):
+                output_profiles()
+
+
+@override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0])
+@mock.patch.object(engine, 'date_font', default_date_font)
+class ClosedCompositeTests(TestCase):
+    """Closed days rendered from the cached composite must match the full render."""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+
+    def render_the_long_way(self, single_date, plan):
+        calendar_sheet = Image.open(plan.template_for(single_date)).convert("RGB")
+        views.draw_dates(calendar_sheet, single_date, plan)
+        calendar_sheet = views.overlays(calendar_sheet, os.path.join(self.work_dir.name, 'page.png'), None,
+                                        plan.closed_overlay)
+        return calendar_sheet.convert("RGB")
+
+    def test_closed_days_match_full_render(self):
+        plan = render_plan('program')
+        # A Sunday, and a Monday as if it were closed for a holiday
+        for single_date in (date(2025, 3, 9), date(2025, 5, 26)):
+            with self.subTest(date=single_date):
+                page = engine.closed_day_page(single_date, plan)
+                self.assertIsNotNone(page)
+                self.assertEqual(page.tobytes(), self.render_the_long_way(single_date, plan).tobytes())
+
+    def test_composite_is_rebuilt_when_an_asset_changes(self):
+        static_dir = settings.STATICFILES_DIRS[0]
+        template = shutil.copy(os.path.join(static_dir, "images/SR_3_Asset_SundayHours.png"), self.work_dir.name)
+        closed_overlay = shutil.copy(os.path.join(static_dir, CLOSED_TODAY), self.work_dir.name)
+
+        first, _ = engine.closed_composite(template, closed_overlay)
+        self.assertIs(engine.closed_composite(template, closed_overlay)[0], first)
+
+        with Image.open(closed_overlay) as image:
+            transparent = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        transparent.save(closed_overlay)
+        os.utime(closed_overlay, (time.time() + 10, time.time() + 10))
+
+        second, overlay_box = engine.closed_composite(template, closed_overlay)
+        self.assertIsNone(overlay_box)
+        self.assertEqual(second.tobytes(), Image.open(template).convert("RGB").tobytes())
+
+    def test_date_under_the_overlay_is_rendered_the_long_way(self):
+        layout = {**DEFAULT_CALENDAR_LAYOUTS['study'], 'date_text': {'position': (2000, 1000), 'size': 80}}
+        with override_settings(CALENDAR_LAYOUTS={'study': layout}):
+            self.assertIsNone(engine.closed_day_page(date(2025, 3, 9), render_plan('study')))
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), 'test_golden')
+# References are stored shrunk by this factor to keep them small
+GOLDEN_REDUCE = 8
+# Share of pixels that may differ noticeably, e.g. from font rasterization, about 75 pixels per page
+GOLDEN_MAX_CHANGED = 0.0005
+
+
+def golden_difference(page, reference):
+    """Return (mean absolute difference, share of pixels off by more than 16) of a page and a reference."""
+    page = page.convert("RGB").reduce(GOLDEN_REDUCE)
+    if page.size != reference.size:
+        return float('inf'), 1.0
+    difference = ImageChops.difference(page, reference.convert("RGB"))
+    channels = difference.split()
+    mean = sum(ImageStat.Stat(difference).mean) / 3
+    worst = ImageChops.lighter(ImageChops.lighter(channels[0], channels[1]), channels[2])
+    changed = worst.point(lambda value: 255 if value > 16 else 0).histogram()[255]
+    return mean, changed / (page.width * page.height)
+
+
+@override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0])
+@mock.patch.object(engine, 'date_font', default_date_font)
+class GoldenRenderTests(TestCase):
+    """
+    Rendered pages must match the stored references, whichever backend renders them.
+
+    Run with UPDATE_GOLDEN=1 to rewrite the references after an intended change to the artwork or layout.
+    """
+    CASES = [
+        ('sunday', 'study', date(2025, 3, 9)),
+        ('range_holiday', 'program', date(2025, 3, 18)),
+        ('artwork_and_closed', 'study', date(2025, 7, 4)),
+        ('artwork_open', 'program', date(2025, 10, 31)),
+        ('month_end', 'study', date(2025, 2, 28)),
+        ('month_start', 'study', date(2025, 3, 1)),
+        ('december_31', 'program', date(2025, 12, 31)),
+        ('new_year', 'program', date(2026, 1, 1)),
+    ]
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+
+        # Flat artwork in the top half that leaves the date uncovered, and one patch that covers it
+        width, height = Image.open(os.path.join(settings.STATICFILES_DIRS[0], CLOSED_TODAY)).size
+        artwork = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        artwork.paste((230, 120, 20, 255), (200, 400, 1400, 1000))
+        artwork.paste((40, 110, 60, 128), (2400, 0, 3546, 300))
+        artwork_path = os.path.join(self.work_dir.name, 'artwork.png')
+        artwork.save(artwork_path)
+
+        Holiday.objects.create(name="Spring Break", date=date(2025, 3, 15), end_date=date(2025, 3, 22), is_closed=True)
+        Holiday.objects.create(name="Independence Day", date=date(2025, 7, 4), is_closed=True, artwork_path=artwork_path)
+        Holiday.objects.create(name="Halloween", date=date(2025, 10, 31), artwork_path=artwork_path)
+        Holiday.objects.create(name="New Year's Day", date=date(2026, 1, 1), is_closed=True)
+
+    def render(self, room_type, single_date, backend):
+        with override_settings(COMPOSITING_BACKEND=backend):
+            michigan_holidays = holidays.US(subdiv="MI", years=single_date.year)
+            [(_, page)] = views.render_pages([single_date], room_type, michigan_holidays)
+        return page
+
+    def backends(self):
+        return ['pil', 'numpy'] if np is not None else ['pil']
+
+    def test_pages_match_references(self):
+        for name, room_type, single_date in self.CASES:
+            reference_path = os.path.join(GOLDEN_DIR, f"{name}.png")
+            if os.environ.get('UPDATE_GOLDEN'):
+                os.makedirs(GOLDEN_DIR, exist_ok=True)
+                self.render(room_type, single_date, 'pil').convert("RGB").reduce(GOLDEN_REDUCE).save(reference_path)
+            reference = Image.open(reference_path)
+
+            for backend in self.backends():
+                with self.subTest(case=name, backend=backend):
+                    mean, changed = golden_difference(self.render(room_type, single_date, backend), reference)
+                    self.assertLess(mean, 0.5)
+                    self.assertLess(changed, GOLDEN_MAX_CHANGED)
+
+    def test_wrong_page_does_not_match(self):
+        # The comparison must notice a page that only differs by its date
+        reference = Image.open(os.path.join(GOLDEN_DIR, "month_end.png"))
+        mean, changed = golden_difference(self.render('study', date(2025, 3, 7), 'pil'), reference)
+        self.assertGreater(changed, GOLDEN_MAX_CHANGED * 2)
+
+
+@override_settings(OUTPUT_PROFILES={'test': {'dpi': None, 'color': 'rgb', 'compression': 'flate'}},
+                   OUTPUT_PROFILE='test')
+class PdfAssemblyTests(MediaRootMixin, TestCase):
+    """The merged PDF must hold one page per day of the month, in date order."""
+
+    @staticmethod
+    def fake_render_pages(days, room_type, michigan_holidays):
+        # Tiny pages whose color identifies the day, yielded out of order like the batch backend does
+        for single_date in sorted(days, key=lambda day: (day.weekday(), day)):
+            yield single_date, Image.new("RGB", (11, 8), (single_date.day * 8, single_date.month * 20, 0))
+
+    def page_dates(self, pdf_path, year):
+        dates = []
+        for page in PdfReader(pdf_path).pages:
+            self.assertEqual([round(float(value)) for value in page.mediabox], [0, 0, 792, 612])
+            image = next(iter(page['/Resources']['/XObject'].values())).get_object()
+            red, green, _ = image.get_data()[:3]
+            dates.append(date(year, green // 20, red // 8))
+        return dates
+
+    def generate(self, month, year):
+        with mock.patch.object(views, 'render_pages', self.fake_render_pages):
+            return views.generate_calendar('study', month, year)
+
+    def test_months_have_every_day_in_order(self):
+        for month, year, days in ((2, 2025, 28), (2, 2028, 29), (3, 2025, 31), (12, 2025, 31)):
+            with self.subTest(month=month, year=year):
+                dates = self.page_dates(self.generate(month, year), year)
+                self.assertEqual(len(dates), days)
+                self.assertEqual(dates, [date(year, month, day) for day in range(1, days + 1)])
+
+    def test_january_requested_in_december_is_next_year(self):
+        class December(datetime):
+            @classmethod
+            def today(cls):
+                return cls(2025, 12, 10)
+
+        with mock.patch.object(views, 'datetime', December):
+            year = views.year_to_print_for(1)
+        self.assertEqual(year, 2026)
+
+        dates = self.page_dates(self.generate(1, year), year)
+        self.assertEqual(dates[0], date(2026, 1, 1))
+        self.assertEqual(dates[-1], date(2026, 1, 31))
+        self.assertEqual(len(dates), 31)
+
+    def test_pdf_is_readable_like_any_new_file(self):
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertEqual(os.stat(self.generate(3, 2025)).st_mode & 0o777, 0o666 & ~umask)
+
+
+class HolidayIndexTests(TestCase):
+    """Holiday lookups resolve overlaps by priority and follow edits to the table."""
+
+    def info(self, date_str, name=None):
+        return views.get_holiday_info(name, date_str)
+
+    def test_overlapping_holidays_resolve_by_priority(self):
+        Holiday.objects.create(name="Winter Break", date=date(2025, 12, 20), end_date=date(2026, 1, 4), is_closed=True)
+        Holiday.objects.create(name="Inventory Week", date=date(2025, 12, 29), end_date=date(2026, 1, 2),
+                               artwork_path="images/inventory.png")
+        Holiday.objects.create(name="Staff Party", date=date(2025, 12, 31), artwork_path="images/party.png")
+
+        self.assertEqual(self.info("2025-12-19"), None)
+        self.assertEqual(self.info("2025-12-20"), (None, True))
+        # The shorter range wins inside the longer one, and a single day wins inside both
+        self.assertEqual(self.info("2025-12-30"), ("images/inventory.png", False))
+        self.assertEqual(self.info("2025-12-31"), ("images/party.png", False))
+        self.assertEqual(self.info("2026-01-03"), (None, True))
+        self.assertEqual(self.info("2026-01-05"), None)
+
+        # Ties go to the closure, whatever order the rows were created in
+        Holiday.objects.create(name="Open Day", date=date(2025, 7, 4))
+        Holiday.objects.create(name="Closed Day", date=date(2025, 7, 4), is_closed=True)
+        self.assertEqual(self.info("2025-07-04"), (None, True))
+
+    def test_name_lookup_prefers_the_current_year(self):
+        Holiday.objects.create(name="Independence Day", date=date(2024, 7, 4), artwork_path="images/2024.png")
+        Holiday.objects.create(name="Independence Day", date=date(2025, 7, 4), artwork_path="images/2025.png",
+                               is_closed=True)
+
+        self.assertEqual(self.info("2025-07-04", "Independence Day"), ("images/2025.png", True))
+        self.assertEqual(self.info("2024-07-04", "Independence Day"), ("images/2024.png", False))
+        # Before any holiday with the name, the earliest one is used
+        self.assertEqual(self.info("2023-07-04", "Independence Day"), ("images/2024.png", False))
+
+    def test_index_follows_edits_and_lookups_stay_in_memory(self):
+        holiday = Holiday.objects.create(name="Spring Break", date=date(2025, 3, 15), end_date=date(2025, 3, 22))
+        self.assertEqual(self.info("2025-03-18"), (None, False))
+
+        # A whole month is resolved with one version check, and the lookups run in memory
+        michigan_holidays = holidays.US(subdiv="MI", years=2025)
+        with self.assertNumQueries(1):
+            resolve = views.holiday_resolver('study', michigan_holidays)
+            overlays = [resolve(date(2025, 3, day)) for day in range(1, 32)]
+        self.assertEqual(overlays[17], (None, False))
+        self.assertEqual(overlays[15], (None, True))
+        with self.assertNumQueries(1):
+            views.holiday_plan_fingerprint('study', 3, 2025)
+
+        holiday.is_closed = True
+        holiday.save()
+        self.assertEqual(self.info("2025-03-18"), (None, True))
+
+        # bulk_create, as import_holidays uses, sends no signals but still refreshes the index
+        Holiday.objects.bulk_create([Holiday(name="Staff Day", date=date(2025, 3, 18), artwork_path="images/staff.png")])
+        self.assertEqual(self.info("2025-03-18"), ("images/staff.png", False))
+
+        Holiday.objects.filter(name="Staff Day").delete()
+        holiday.delete()
+        self.assertEqual(self.info("2025-03-18"), None)
+
+    def test_index_follows_bulk_updates_that_set_updated_at(self):
+        Holiday.objects.create(name="Spring Break", date=date(2025, 3, 15), end_date=date(2025, 3, 22))
+        self.assertEqual(self.info("2025-03-18"), (None, False))
+
+        Holiday.objects.filter(name="Spring Break").update(is_closed=True, updated_at=timezone.now())
+        self.assertEqual(self.info("2025-03-18"), (None, True))
+
+    def test_index_follows_deleted_artwork(self):
+        old_artwork = ArtworkOverlay.objects.create(name="Old", image="artwork/old.png")
+        new_artwork = ArtworkOverlay.objects.create(name="New", image="artwork/new.png")
+        Holiday.objects.create(name="Spring Break", date=date(2025, 3, 15), artwork=old_artwork)
+        Holiday.objects.create(name="Halloween", date=date(2025, 10, 31), artwork=new_artwork)
+        self.assertEqual(self.info("2025-03-15"), (old_artwork.image.path, False))
+
+        # The holiday's artwork is cleared by a bulk update, and the newest artwork is unchanged
+        old_artwork.delete()
+        self.assertEqual(self.info("2025-03-15"), (None, False))
+
+
+@unittest.skipUnless(cli, "the command line renderer needs typer and rich")
+class CommandLineRendererTests(SimpleTestCase):
+    """The engine and the command line renderer work without Django."""
+
+    def test_engine_and_cli_do_not_import_django(self):
+        script = ("import sys, calendar_generator.cli, calendar_generator.engine; "
+                  "print(sorted(name for name in sys.modules if name.split('.')[0] == 'django'))")
+        environment = {key: value for key, value in os.environ.items() if key != 'DJANGO_SETTINGS_MODULE'}
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=settings.BASE_DIR, env=environment)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_holiday_file_resolves_like_the_database(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as holiday_file:
+            holiday_file.write("name,date,end_date,is_closed,artwork_path\n"
+                               "Winter Break,2025-12-20,2026-01-04,true,\n"
+                               "Staff Party,2025-12-31,,false,images/party.png\n"
+                               "Independence Day,2025-07-04,,false,images/july.png\n")
+        self.addCleanup(os.unlink, holiday_file.name)
+
+        plan = engine.compile_layouts(DEFAULT_CALENDAR_LAYOUTS, settings.STATICFILES_DIRS[0])['study']
+        index = engine.HolidayIndex(cli.read_holidays(holiday_file.name))
+        resolve = engine.index_resolver(plan, index, holidays.US(subdiv="MI", years=2025))
+        self.assertEqual(resolve(date(2025, 12, 30)), (None, True))
+        self.assertEqual(resolve(date(2025, 12, 31)), ("images/party.png", False))
+        # Public holidays are found by name, and Sundays are closed by the layout
+        self.assertEqual(resolve(date(2025, 7, 4)), ("images/july.png", False))
+        self.assertEqual(resolve(date(2025, 7, 6)), (None, True))
+        self.assertEqual(resolve(date(2025, 7, 7)), (None, False))
+
+    def test_invalid_month_is_rejected(self):
+        result = CliRunner().invoke(cli.app, ['render', '2025-13'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("expected YYYY-MM", result.output)
+
+    def layouts_file(self, layouts):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as layouts_file:
+            layouts_file.write(layouts if isinstance(layouts, str) else json.dumps(layouts))
+        self.addCleanup(os.unlink, layouts_file.name)
+        return layouts_file.name
+
+    def test_layouts_file_replaces_the_default_layouts(self):
+        teen = {'label': 'Teen Room', 'templates': {'default': 'images/SR_0_Asset_WeekdayHours.png'},
+                'closed_overlay': 'images/4_Asset_ClosedToday.png', 'date_text': {'position': [3274, 114]}}
+        layouts = self.layouts_file({'teen': teen})
+        result = CliRunner().invoke(cli.app, ['render', '2025-09', '--layouts', layouts, '--room', 'study'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("unknown room type study, use teen", result.output)
+
+        with mock.patch.object(cli, 'render_month') as render_month:
+            result = CliRunner().invoke(cli.app, ['render', '2025-09', '--layouts', layouts, '--font', __file__,
+                                                  '--static-root', settings.STATICFILES_DIRS[0], '--output',
+                                                  tempfile.gettempdir()])
+        self.assertEqual(result.exit_code, 0, result.output)
+        [(plan, *_)] = [call.args for call in render_month.call_args_list]
+        self.assertEqual((plan.room_type, plan.label, plan.date_position), ('teen', 'Teen Room', (3274, 114)))
+
+    def test_invalid_layouts_file_is_rejected(self):
+        for layouts, message in (('{"teen": ', "Expecting value"), ('[]', "expected an object"),
+                                 ({'teen': {'label': 'Teen Room'}}, "layout 'teen' is missing 'templates'")):
+            with self.subTest(message=message):
+                result = CliRunner().invoke(cli.app, ['render', '2025-09', '--layouts', self.layouts_file(layouts)])
+                self.assertEqual(result.exit_code, 2)
+                self.assertIn(message, result.output)
+
+
+class ProfiledGenerationTests(MediaRootMixin, TestCase):
+    """Staff can profile a single render, and other renders are not profiled."""
+
+    @staticmethod
+    def fake_generate_calendar(room_type, month, year, progress=None):
+        # Busy long enough for the stack sampler to see this frame
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return write_stub_calendar(room_type, month, year)
+
+    def run_generation(self, profile):
+        calendar = CalendarGeneration.objects.create(room_type='study', month=3, year=2025)
+        # run_generation normally runs in a pool thread and closes its connection when done
+        with mock.patch.object(views, 'generate_calendar', self.fake_generate_calendar), \
+                mock.patch.object(views, 'close_old_connections'):
+            views.run_generation(calendar.id, profile=profile)
+        calendar.refresh_from_db()
+        self.assertEqual(calendar.status, 'done')
+        return calendar
+
+    def test_profiled_render_saves_stats_and_stacks(self):
+        calendar = self.run_generation(profile=True)
+
+        stats = pstats.Stats(calendar.profile_stats.path)
+        self.assertTrue(any(function == 'fake_generate_calendar' for _, _, function in stats.stats))
+        with open(calendar.profile_stacks.path) as stacks_file:
+            stacks = [line.rsplit(' ', 1) for line in stacks_file]
+        self.assertTrue(stacks)
+        self.assertTrue(all(int(count) > 0 for _, count in stacks))
+        self.assertTrue(any('ProfiledGenerationTests.fake_generate_calendar' in stack.split(';')[-1]
+                            for stack, _ in stacks))
+
+        # Only staff can download the profile
+        User = get_user_model()
+        client = Client()
+        client.force_login(User.objects.create_user('visitor', password='x'))
+        self.assertEqual(client.get(reverse('download_profile', args=[calendar.id, 'stacks'])).status_code, 302)
+        client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        response = client.get(reverse('download_profile', args=[calendar.id, 'stacks']))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'fake_generate_calendar', b''.join(response.streaming_content))
+
+    def test_unprofiled_render_does_not_touch_the_profiler(self):
+        with mock.patch.object(views, 'capture_profile') as capture_profile:
+            calendar = self.run_generation(profile=False)
+        capture_profile.assert_not_called()
+        self.assertFalse(calendar.profile_stats)
+
+    def test_profile_query_parameter_is_staff_only(self):
+        User = get_user_model()
+        client = Client()
+        with mock.patch.object(views, 'start_generation') as start_generation:
+            client.post('/?profile=1', {'room_type': 'study', 'month': 3})
+            client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+            client.post('/?profile=1', {'room_type': 'study', 'month': 3})
+            client.post('/', {'room_type': 'study', 'month': 3})
+        self.assertEqual([call.kwargs['profile'] for call in start_generation.call_args_list], [False, True, False])
+
+    def test_form_keeps_the_profile_switch_for_staff(self):
+        User = get_user_model()
+        users = [User.objects.create_user('visitor', password='x'),
+                 User.objects.create_user('staff', password='x', is_staff=True)]
+
+        def form_actions():
+            client = Client()
+            for user in users:
+                client.force_login(user)
+                yield 'action="/?profile=1"' in client.get('/?profile=1').content.decode()
+
+        async def async_form_actions():
+            client = AsyncClient()
+            actions = []
+            for user in users:
+                await client.aforce_login(user)
+                actions.append('action="/?profile=1"' in (await client.get('/?profile=1')).content.decode())
+            return actions
+
+        self.assertEqual(list(form_actions()), [False, True])
+        # The template can't read request.user under the async view, so the view works the switch out
+        use_async_views(self)
+        self.assertEqual(async_to_sync(async_form_actions)(), [False, True])
+
+
+def use_async_views(test_case):
+    """Route requests to the async views, as ASYNC_VIEWS=True does under ASGI, for the rest of the test."""
+    from roomscalendar import urls as project_urls
+
+    def reload_urls():
+        importlib.reload(urls)
+        importlib.reload(project_urls)
+        clear_url_caches()
+
+    settings_override = override_settings(ASYNC_VIEWS=True)
+    settings_override.enable()
+    reload_urls()
+    test_case.addCleanup(reload_urls)
+    test_case.addCleanup(settings_override.disable)
+
+
+class BundleStreamingTests(MediaRootMixin, TransactionTestCase):
+    """Bundles are sent calendar by calendar, in both the sync and the async views."""
+
+    def setUp(self):
+        super().setUp()
+        self.generated = []
+        patcher = mock.patch.object(views, 'generate_calendar_once', self.fake_generate_calendar_once)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_generate_calendar_once(self, room_type, month, year, progress=None):
+        # One tiny page whose color identifies the calendar
+        self.generated.append((room_type, month))
+        output_path = views.calendar_output_path(room_type, month, year)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        page = Image.new("RGB", (11, 8), (month * 20, 100 if room_type == 'study' else 200, 0))
+        with open(output_path, 'wb') as pdf:
+            pdf.write(engine.flate_page_pdf(page, (11, 8.5)))
+        return output_path
+
+    def page_colors(self, pdf_data):
+        colors = []
+        for page in PdfReader(io.BytesIO(pdf_data), strict=True).pages:
+            image = next(iter(page['/Resources']['/XObject'].values())).get_object()
+            colors.append(tuple(image.get_data()[:2]))
+        return colors
+
+    def post(self, client, bundle_format):
+        return client.post('/bundle/', {'calendars': ['study-3', 'program-4'], 'bundle_format': bundle_format})
+
+    def test_zip_bundle(self):
+        response = self.post(Client(), 'zip')
+        self.assertTrue(response.streaming)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            names = archive.namelist()
+            self.assertEqual(len(names), 2)
+            self.assertEqual([self.page_colors(archive.read(name)) for name in names], [[(60, 100)], [(80, 200)]])
+
+    def test_pdf_bundle_is_sent_calendar_by_calendar(self):
+        chunks = views.stream_pdf_bundle([('study', 3), ('program', 4)])
+        first_chunk = next(chunks)
+        # The first calendar's page is sent before the second calendar is generated
+        self.assertEqual(self.generated, [('study', 3)])
+        self.assertTrue(first_chunk.startswith(b'%PDF'))
+        self.assertIn(b'/Type /Page', first_chunk)
+
+        self.assertEqual(self.page_colors(first_chunk + b''.join(chunks)), [(60, 100), (80, 200)])
+        self.assertEqual(self.page_colors(b''.join(self.post(Client(), 'pdf').streaming_content)),
+                         [(60, 100), (80, 200)])
+
+    def test_async_bundle_streams_from_a_thread(self):
+        use_async_views(self)
+
+        async def download():
+            response = await self.post(AsyncClient(), 'pdf')
+            self.assertTrue(response.is_async)
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(self.page_colors(async_to_sync(download)()), [(60, 100), (80, 200)])
+
+    def test_async_iteration_stops_the_thread_when_closed(self):
+        produced = []
+
+        def slow_parts():
+            for part in range(100):
+                produced.append(part)
+                yield b'x'
+
+        async def read_one():
+            parts = views.iterate_in_thread(slow_parts(), max_pending=1)
+            await anext(parts)
+            await parts.aclose()
+
+        async_to_sync(read_one)()
+        time.sleep(views.PROGRESS_POLL_INTERVAL * 3)
+        # Only the parts already waiting in the queue were produced
+        self.assertLess(len(produced), 5)
+
+
+class HolidayFileTests(SimpleTestCase):
+    """CSV and iCalendar holidays read back the fields they were written with."""
+
+    def test_csv(self):
+        contents = ("name,date,end_date,is_closed,artwork_path\n"
+                    "Winter Break,2025-12-22,2025-12-31,yes,winter.png\n"
+                    "\"Labor Day, observed\",2025-09-01,2025-09-01,,\n")
+        expected = [
+            (2, {'name': 'Winter Break', 'date': date(2025, 12, 22), 'end_date': date(2025, 12, 31),
+                 'is_closed': True, 'artwork_path': 'winter.png'}),
+            # Single-day holidays are stored without an end date
+            (3, {'name': 'Labor Day, observed', 'date': date(2025, 9, 1), 'end_date': None,
+                 'is_closed': False, 'artwork_path': None}),
+        ]
+        self.assertEqual(list(read_csv(io.StringIO(contents))), expected)
+
+        # Excel saves "CSV UTF-8" with a byte order mark
+        for encoded in (contents.encode('utf-8'), codecs.BOM_UTF8 + contents.encode('utf-8')):
+            with self.subTest(bom=encoded.startswith(codecs.BOM_UTF8)):
+                lines = io.TextIOWrapper(io.BytesIO(encoded), encoding=READ_ENCODING, newline='')
+                self.assertEqual(list(read_csv(lines)), expected)
+
+    def test_csv_errors_name_the_line(self):
+        with self.assertRaisesMessage(HolidayFileError, "Missing required column(s): date"):
+            list(read_csv(io.StringIO("name\nNew Year\n")))
+        with self.assertRaisesMessage(HolidayFileError, "Line 3: Invalid date '2025-13-01'"):
+            list(read_csv(io.StringIO("name,date\nA,2025-01-01\nB,2025-13-01\n")))
+        with self.assertRaisesMessage(HolidayFileError, "Line 2: End date 2025-01-01 is before"):
+            list(read_csv(io.StringIO("name,date,end_date\nA,2025-01-02,2025-01-01\n")))
+
+    def test_ics(self):
+        rows = list(read_ics(io.StringIO(
+            "BEGIN:VCALENDAR\r\n"
+            "BEGIN:VEVENT\r\n"
+            "DTSTART;VALUE=DATE:20251222\r\n"
+            # All-day DTEND is exclusive, so the break ends on the 31st
+            "DTEND;VALUE=DATE:20260101\r\n"
+            "SUMMARY:Winter\\, Spring\\; and \\\\Summer\r\n"
+            " Break\r\n"
+            "END:VEVENT\r\n"
+            "BEGIN:VEVENT\r\n"
+            "DTSTART:20250901T090000\r\n"
+            "DTEND:20250901T170000\r\n"
+            "SUMMARY:Labor Day\r\n"
+            "X-ROOMSCALENDAR-CLOSED:FALSE\r\n"
+            "END:VEVENT\r\n"
+            "END:VCALENDAR\r\n"
+        ), default_closed=True))
+        self.assertEqual(rows, [
+            (2, {'name': 'Winter, Spring; and \\SummerBreak', 'date': date(2025, 12, 22),
+                 'end_date': date(2025, 12, 31), 'is_closed': True, 'artwork_path': None}),
+            # A timed DTEND is the last day itself
+            (8, {'name': 'Labor Day', 'date': date(2025, 9, 1), 'end_date': None,
+                 'is_closed': False, 'artwork_path': None}),
+        ])
+
+    def test_ics_round_trip_folds_long_lines(self):
+        holiday = Holiday(pk=7, name="Ünïcödé, the; very long holiday name " * 3, date=date(2025, 12, 22),
+                          end_date=date(2025, 12, 31), is_closed=True, artwork_path='art/winter break.png')
+        stream = io.StringIO()
+        write_ics(stream, [holiday])
+        self.assertTrue(all(len(line.encode('utf-8')) <= 75 for line in stream.getvalue().split('\r\n')))
+        stream.seek(0)
+        self.assertEqual(list(read_ics(stream)), [(4, {
+            'name': holiday.name.strip(), 'date': holiday.date, 'end_date': holiday.end_date,
+            'is_closed': True, 'artwork_path': 'art/winter break.png',
+        })])
+
+
+class HolidayCommandTests(TestCase):
+    """import_holidays upserts on (name, date) and create_holiday_range updates rather than duplicates."""
+
+    def import_csv(self, contents, *options, encoding='utf-8'):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding=encoding) as holiday_file:
+            holiday_file.write(contents)
+        self.addCleanup(os.remove, holiday_file.name)
+        output = io.StringIO()
+        call_command('import_holidays', holiday_file.name, *options, stdout=output)
+        return output.getvalue()
+
+    def test_import_upserts(self):
+        Holiday.objects.create(name='Winter Break', date=date(2025, 12, 22), end_date=date(2025, 12, 30))
+        Holiday.objects.create(name='Labor Day', date=date(2025, 9, 1))
+        output = self.import_csv(
+            "name,date,end_date,is_closed\n"
+            "Winter Break,2025-12-22,2025-12-31,true\n"
+            "Labor Day,2025-09-01,,false\n"
+            "New Year,2026-01-01,,true\n"
+        )
+        self.assertIn("1 created, 1 updated, 1 unchanged", output)
+        self.assertEqual(
+            sorted(Holiday.objects.values_list('name', 'end_date', 'is_closed')),
+            [('Labor Day', None, False), ('New Year', None, True), ('Winter Break', date(2025, 12, 31), True)],
+        )
+
+    def test_import_reads_excel_csv_with_a_byte_order_mark(self):
+        output = self.import_csv("name,date\nNew Year,2026-01-01\n", encoding='utf-8-sig')
+        self.assertIn("1 created", output)
+        self.assertEqual(list(Holiday.objects.values_list('name', flat=True)), ['New Year'])
+
+    def test_import_dry_run_reports_the_diff_without_writing(self):
+        holiday = Holiday.objects.create(name='Winter Break', date=date(2025, 12, 22), end_date=date(2025, 12, 30))
+        output = self.import_csv(
+            "name,date,end_date,is_closed\n"
+            "Winter Break,2025-12-22,2025-12-31,true\n"
+            "New Year,2026-01-01,,true\n",
+            '--dry-run',
+        )
+        self.assertIn("+ New Year on 2026-01-01", output)
+        self.assertIn("~ Winter Break from 2025-12-22 to 2025-12-31 (end_date: datetime.date(2025, 12, 30) -> "
+                      "datetime.date(2025, 12, 31); is_closed: False -> True)", output)
+        self.assertIn("Dry run, nothing written: 1 created, 1 updated, 0 unchanged.", output)
+        self.assertEqual(list(Holiday.objects.all()), [holiday])
+        holiday.refresh_from_db()
+        self.assertEqual(holiday.end_date, date(2025, 12, 30))
+
+    def test_create_holiday_range_updates_an_existing_holiday(self):
+        def create(*arguments):
+            output = io.StringIO()
+            call_command('create_holiday_range', 'Winter Break', '2025-12-22', *arguments, stdout=output)
+            return output.getvalue()
+
+        self.assertIn("Created holiday", create('2025-12-30'))
+        self.assertIn("already exists", create('2025-12-30'))
+        self.assertIn("Updated holiday: Winter Break from 2025-12-22 (end_date: datetime.date(2025, 12, 30) -> "
+                      "datetime.date(2026, 1, 2); is_closed: False -> True)", create('2026-01-02', '--closed'))
+        holiday = Holiday.objects.get()
+        self.assertEqual((holiday.end_date, holiday.is_closed), (date(2026, 1, 2), True))
+
+
+class HolidayDeduplicationMigrationTests(TransactionTestCase):
+    """Migration 0004 merges holidays sharing a name and date before adding the unique constraint."""
+
+    before = [('calendar_generator', '0003_artworkoverlay_holiday_artwork')]
+    after = [('calendar_generator', '0004_holiday_unique_name_date')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldHoliday = executor.loader.project_state(self.before).apps.get_model('calendar_generator', 'Holiday')
+        kept = OldHoliday.objects.create(name='Winter Break', date=date(2025, 12, 22), end_date=date(2025, 12, 30))
+        OldHoliday.objects.create(name='Winter Break', date=date(2025, 12, 22), end_date=date(2026, 1, 2))
+        OldHoliday.objects.create(name='Winter Break', date=date(2025, 12, 22), is_closed=True,
+                                  artwork_path='winter.png')
+        other = OldHoliday.objects.create(name='Winter Break', date=date(2025, 12, 22) + timedelta(days=365))
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        NewHoliday = executor.loader.project_state(self.after).apps.get_model('calendar_generator', 'Holiday')
+        self.assertEqual(
+            list(NewHoliday.objects.order_by('id').values_list('id', 'end_date', 'is_closed', 'artwork_path')),
+            [(kept.id, date(2026, 1, 2), True, 'winter.png'), (other.id, None, False, None)],
+        )
+
+
+@override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0])
+@mock.patch.object(engine, 'date_font', default_date_font)
+class PreviewTests(TestCase):
+    """The preview endpoint returns a month grid or a single page."""
+
+    def preview(self, **params):
+        return Client().get('/preview/', {'room_type': 'study', 'month': 3, 'format': 'png', **params})
+
+    def test_month_grid(self):
+        response = self.preview()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        grid = Image.open(io.BytesIO(response.content))
+        page = views.scaled_asset(render_plan('study').template_for(date(2025, 3, 3)), views.PREVIEW_THUMBNAIL_REDUCE)
+        # Seven Sunday-first columns of thumbnails
+        self.assertEqual(grid.width, 7 * (page.width + views.PREVIEW_GRID_PADDING) + views.PREVIEW_GRID_PADDING)
+
+    def test_single_day(self):
+        response = self.preview(day=3, format='webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        year = views.year_to_print_for(3)
+        page = views.scaled_asset(render_plan('study').template_for(date(year, 3, 3)), views.PREVIEW_PAGE_REDUCE)
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, page.size)
+
+    def test_bad_day(self):
+        for day in ('32', 'first'):
+            with self.subTest(day=day):
+                self.assertEqual(self.preview(day=day).status_code, 400)
+        self.assertEqual(self.preview(room_type='attic').status_code, 400)
+
+
+class PregenerationScheduleTests(SimpleTestCase):
+    """Quiet hours may wrap past midnight, and the upcoming months roll over into the next year."""
+
+    def test_quiet_hours(self):
+        in_quiet_hours = pregenerate_calendars.Command.in_quiet_hours
+        self.assertEqual([hour for hour in range(24) if in_quiet_hours(hour, 1, 5)], [1, 2, 3, 4])
+        self.assertEqual([hour for hour in range(24) if in_quiet_hours(hour, 22, 3)], [0, 1, 2, 22, 23])
+        self.assertEqual([hour for hour in range(24) if in_quiet_hours(hour, 4, 4)], [])
+
+    def upcoming_months(self, today, count):
+        class FixedDatetime(datetime):
+            @classmethod
+            def today(cls):
+                return cls(today.year, today.month, today.day)
+
+        with mock.patch.object(views, 'datetime', FixedDatetime):
+            return list(views.upcoming_months(count))
+
+    def test_upcoming_months_roll_into_next_year(self):
+        self.assertEqual(self.upcoming_months(date(2025, 11, 15), 3), [(12, 2025), (1, 2026), (2, 2026)])
+        # From December, March onwards would print for the current year, so they are left out
+        self.assertEqual(self.upcoming_months(date(2025, 12, 1), 4), [(1, 2026), (2, 2026)])
+        self.assertEqual(self.upcoming_months(date(2025, 6, 1), 2), [(7, 2025), (8, 2025)])
+
+
+class LoadTestHelperTests(SimpleTestCase):
+
+    def test_parse_mix(self):
+        parse_mix = loadtest.Command.parse_mix
+        self.assertEqual(parse_mix('download=3, print'), {'download': 3.0, 'print': 1.0})
+        with self.assertRaisesMessage(CommandError, "Unknown endpoint 'upload'"):
+            parse_mix('download,upload=2')
+        with self.assertRaisesMessage(CommandError, "Invalid weight 'lots' for download"):
+            parse_mix('download=lots')
+        with self.assertRaisesMessage(CommandError, "at least one endpoint with a positive weight"):
+            parse_mix('download=0')
+
+    def test_nearest_rank_percentile(self):
+        values = list(range(1, 11))
+        self.assertEqual(loadtest.percentile([], 50), 0.0)
+        self.assertEqual(loadtest.percentile(values, 50), 5)
+        self.assertEqual(loadtest.percentile(values, 95), 10)
+        self.assertEqual(loadtest.percentile(values, 99), 10)
+        self.assertEqual(loadtest.percentile(values, 0), 1)
+        self.assertEqual(loadtest.percentile([0.2], 99), 0.2)
+
+
+class AsyncViewTests(MediaRootMixin, TransactionTestCase):
+    """The views used with ASYNC_VIEWS=True under ASGI."""
+
+    def setUp(self):
+        super().setUp()
+        use_async_views(self)
+
+    def finished_calendar(self, size):
+        calendar = CalendarGeneration.objects.create(room_type='study', month=3, year=2025, status='done',
+                                                     pdf_file='calendars/Study_Room_March_2025.pdf')
+        os.makedirs(os.path.dirname(calendar.pdf_file.path))
+        with open(calendar.pdf_file.path, 'wb') as pdf:
+            pdf.write(os.urandom(size))
+        return calendar
+
+    def test_home_starts_a_generation(self):
+        async def post_forms():
+            client = AsyncClient()
+            self.assertEqual((await client.get('/')).status_code, 200)
+            responses = [await client.post('/?profile=1', {'room_type': 'study', 'month': 3})]
+            await client.aforce_login(await get_user_model().objects.acreate_user('staff', password='x', is_staff=True))
+            responses.append(await client.post('/?profile=1', {'room_type': 'program', 'month': 4}))
+            return responses
+
+        # The real start_generation runs inside the async view; only the render itself is left out
+        with mock.patch.object(views, 'run_generation') as run_generation:
+            responses = async_to_sync(post_forms)()
+            wait_for_calls(run_generation, 2)
+        self.assertEqual([response.status_code for response in responses], [302, 302])
+        calendars = list(CalendarGeneration.objects.order_by('id'))
+        self.assertEqual([response.url for response in responses],
+                         [reverse('calendar_success', args=[calendar.id]) for calendar in calendars])
+        self.assertEqual([(calendar.room_type, calendar.status, calendar.year) for calendar in calendars],
+                         [('study', 'pending', views.year_to_print_for(3)),
+                          ('program', 'pending', views.year_to_print_for(4))])
+        # Only staff can ask for a profile
+        self.assertEqual(sorted(call.args for call in run_generation.call_args_list),
+                         [(calendars[0].id, False), (calendars[1].id, True)])
+
+    def test_download_is_streamed_in_chunks(self):
+        calendar = self.finished_calendar(views.STREAM_CHUNK_SIZE * 2 + 100)
+
+        async def download():
+            response = await AsyncClient().get(reverse('download_calendar', args=[calendar.id]))
+            return response, [chunk async for chunk in response.streaming_content]
+
+        response, chunks = async_to_sync(download)()
+        self.assertEqual(response['Content-Length'], str(views.STREAM_CHUNK_SIZE * 2 + 100))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Study_Room_March_2025.pdf"')
+        self.assertEqual([len(chunk) for chunk in chunks], [views.STREAM_CHUNK_SIZE, views.STREAM_CHUNK_SIZE, 100])
+        with open(calendar.pdf_file.path, 'rb') as pdf:
+            self.assertEqual(b''.join(chunks), pdf.read())
+
+        # An unfinished calendar can't be downloaded yet
+        CalendarGeneration.objects.filter(id=calendar.id).update(status='running')
+        response = async_to_sync(AsyncClient().get)(reverse('download_calendar', args=[calendar.id]))
+        self.assertEqual(response.url, reverse('calendar_success', args=[calendar.id]))
+
+    def print_calendar(self, calendar, lpr_async):
+        async def print_and_follow():
+            client = AsyncClient()
+            response = await client.get(reverse('print_calendar', args=[calendar.id]))
+            self.assertEqual(response.url, reverse('calendar_success', args=[calendar.id]))
+            return (await client.get(response.url)).content.decode()
+
+        with mock.patch.object(views, 'lpr_async', lpr_async):
+            return async_to_sync(print_and_follow)()
+
+    @override_settings(NETWORK_PRINTER_NAME='Ricoh')
+    def test_print_sends_the_calendar_to_lpr(self):
+        calendar = self.finished_calendar(100)
+        lpr_async = mock.AsyncMock()
+        page = self.print_calendar(calendar, lpr_async)
+        lpr_async.assert_awaited_once_with(*views.lpr_arguments(calendar.pdf_file.path, 'Ricoh'))
+        self.assertIn("Calendar sent to Ricoh printer successfully.", page)
+
+    def test_print_reports_lpr_errors(self):
+        calendar = self.finished_calendar(100)
+        page = self.print_calendar(calendar, mock.AsyncMock(side_effect=views.PrintError("printer is out of paper")))
+        self.assertIn("Error sending to printer: printer is out of paper", page)
@@ -1,10 +1,30 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
+# Under ASGI the async views keep slow renders, file reads and print jobs off the event loop
+if getattr(settings, 'ASYNC_VIEWS', False):
+    home_view = views.home_async
+    download_view = views.download_calendar_async
+    print_view = views.print_calendar_async
+    progress_view = views.calendar_progress_async
+    bundle_view = views.download_bundle_async
+else:
+    home_view = views.home
+    download_view = views.download_calendar
+    print_view = views.print_calendar
+    progress_view = views.calendar_progress
+    bundle_view = views.download_bundle
+
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', home_view, name='home'),
     path('success/<int:calendar_id>/', views.calendar_success, name='calendar_success'),
-    path('download/<int:calendar_id>/', views.download_calendar, name='download_calendar'),
-    path('print/<int:calendar_id>/', views.print_calendar, name='print_calendar'),
+    path('progress/<int:calendar_id>/', progress_view, name='calendar_progress'),
+    path('cancel/<int:calendar_id>/', views.cancel_calendar, name='cancel_calendar'),
+    path('download/<int:calendar_id>/', download_view, name='download_calendar'),
+    path('print/<int:calendar_id>/', print_view, name='print_calendar'),
+    path('bundle/', bundle_view, name='download_bundle'),
+    path('preview/', views.preview_calendar, name='preview_calendar'),
+    path('profile/<int:calendar_id>/<str:kind>/', views.download_profile, name='download_profile'),
 ]
@@ -1,13 +1,28 @@
+import asyncio
+import hashlib
+import io
+import json
 import os
+import queue
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
+from functools import lru_cache
 
 import holidays
-from PIL import Image, ImageDraw, ImageFont
-from PyPDF2 import PdfMerger
+from asgiref.sync import sync_to_async
+from PIL import Image
 from django.conf import settings
 from django.contrib import messages
-from django.http import FileResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Q
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseServerError,
+                         StreamingHttpResponse)
 from django.shortcuts import render, redirect
+from django.utils import timezone
 
 # Try to import sh module, provide fallback if not available.
 try:
@@ -25,30 +40,67 @@ except ImportError:
     class ErrorReturnCode(Exception):
         pass
 
-from .forms import CalendarGenerationForm
-from .models import CalendarGeneration, Holiday
+from . import engine
+from .engine import StreamingPdfWriter, draw_dates
+from .forms import CalendarBundleForm, CalendarGenerationForm
+from .holiday_index import holiday_index
+from .layouts import render_plan
+from .pdf_output import output_profile
+from .profiling import capture_profile
+from .models import CalendarGeneration
+from .singleflight import SharedProgress, SingleFlight
 
-# Define constants for assets
-STATUS_CLOSED = "images/4_Asset_ClosedToday.png"
-# Study Room assets
-SR_WEEKDAY_HOURS = "images/SR_0_Asset_WeekdayHours.png"
-SR_FRIDAY_HOURS = "images/SR_1_Asset_FridayHours.png"
-SR_SATURDAY_HOURS = "images/SR_2_Asset_SaturdayHours.png"
-SR_SUNDAY_HOURS = "images/SR_3_Asset_SundayHours.png"
-# Program Room assets
-PR_WEEKDAY_HOURS = "images/PR_0_Asset_WeekdayHours.png"
-PR_FRIDAY_HOURS = "images/PR_1_Asset_FridayHours.png"
-PR_SATURDAY_HOURS = "images/PR_2_Asset_SaturdayHours.png"
-PR_SUNDAY_HOURS = "images/PR_3_Asset_SundayHours.png"
+# Size of the chunks streamed back to the client for downloads and bundles
+STREAM_CHUNK_SIZE = 64 * 1024
 
-# Define font
-DATE_STRING_FONT_PATH = os.path.join(settings.STATIC_ROOT, 'fonts', 'SF-Pro-Text-Black.ttf')
+# Bundle chunks that may wait between the thread building a bundle and an async response
+BUNDLE_QUEUE_SIZE = 4
 
+# Previews are rendered from templates shrunk by these integer factors
+PREVIEW_PAGE_REDUCE = 4
+PREVIEW_THUMBNAIL_REDUCE = 8
+PREVIEW_GRID_PADDING = 8
 
-# Function to get holiday information from the database
+# Bounded pool that runs calendar rendering for the async views, off the event loop
+RENDER_WORKERS = getattr(settings, 'RENDER_WORKERS', min(4, os.cpu_count() or 1))
+_render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='calendar-render')
+
+# How often the progress stream checks a generation, and how long it follows one. The sync view ends its
+# stream sooner so it doesn't hold a WSGI thread; the browser reconnects after PROGRESS_RETRY_INTERVAL
+PROGRESS_POLL_INTERVAL = 0.5
+PROGRESS_STREAM_TIMEOUT = 15 * 60
+PROGRESS_LONG_POLL_TIMEOUT = 10
+PROGRESS_RETRY_INTERVAL = 1
+
+# Workers mark the generations they have queued or running every GENERATION_HEARTBEAT_INTERVAL seconds, and
+# a generation not marked for GENERATION_STALE_AFTER seconds was lost, for example to a restart
+GENERATION_HEARTBEAT_INTERVAL = 30
+GENERATION_STALE_AFTER = getattr(settings, 'GENERATION_STALE_AFTER', 5 * 60)
+STALE_GENERATION_ERROR = "The server stopped before this calendar was finished. Please generate it again."
+
+# Shares one render between identical calendar requests that arrive at the same time, with its progress
+_generation_flight = SingleFlight()
+_generation_progress = SharedProgress()
+
+# Generations queued or running in this process, see send_heartbeats
+_active_generations = set()
+_active_generations_lock = threading.Lock()
+_heartbeat_thread = None
+
+class PrintError(Exception):
+    """Raised when lpr fails to queue a print job."""
+
+
+class GenerationCancelled(Exception):
+    """Raised from a progress callback to stop a calendar generation."""
+
+
+# Function to get holiday information from the in-process holiday index
 def get_holiday_info(holiday_name=None, date_str=None):
     """
-    Get holiday information from the database.
+    Get holiday information from the in-process holiday index.
+
+    The index is rebuilt when the Holiday table changes, see holiday_index.py.
 
     Args:
         holiday_name (str, optional): The name of the holiday.
@@ -58,46 +110,18 @@ def get_holiday_info(holiday_name=None, date_str=None):
         tuple: A tuple containing (artwork_path, is_closed) or None if no holiday is found.
     """
     try:
-        # Try to find by name first
-        if holiday_name:
-            holiday = Holiday.objects.filter(name=holiday_name).first()
-            if holiday:
-                # Check if holiday has an uploaded artwork
-                if holiday.artwork and holiday.artwork.image:
-                    return (holiday.artwork.image.path, holiday.is_closed)
-                # Fall back to artwork_path if no uploaded artwork
-                return (holiday.artwork_path, holiday.is_closed)
-
-        # Then try to find by date
+        date_obj = None
         if date_str:
             try:
                 date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-
-                # Check for exact date match
-                holiday = Holiday.objects.filter(date=date_obj).first()
-                if holiday:
-                    # Check if holiday has an uploaded artwork
-                    if holiday.artwork and holiday.artwork.image:
-                        return (holiday.artwork.image.path, holiday.is_closed)
-                    # Fall back to artwork_path if no uploaded artwork
-                    return (holiday.artwork_path, holiday.is_closed)
-
-                # Check if date falls within a date range
-                range_holiday = Holiday.objects.filter(
-                    date__lte=date_obj,
-                    end_date__gte=date_obj
-                ).first()
-                if range_holiday:
-                    # Check if holiday has an uploaded artwork
-                    if range_holiday.artwork and range_holiday.artwork.image:
-                        return (range_holiday.artwork.image.path, range_holiday.is_closed)
-                    # Fall back to artwork_path if no uploaded artwork
-                    return (range_holiday.artwork_path, range_holiday.is_closed)
-
             except ValueError:
                 pass
 
-        return None
+        # One query to check the index is current, then the lookups run in memory
+        index = holiday_index()
+
+        # Try to find by name first, then by date, where overlapping holidays resolve by priority
+        return index.lookup(date_obj, holiday_name)
     except Exception as e:
         print(f"Error getting holiday info: {e}")
         return None
@@ -106,6 +130,8 @@ def get_holiday_info(holiday_name=None, date_str=None):
 def home(request):
     """Home page view with calendar generation form."""
     form = CalendarGenerationForm()
+    # Staff can add ?profile=1 to profile this render, see run_generation
+    profile_requested = request.GET.get('profile') == '1' and request.user.is_staff
 
     if request.method == 'POST':
         form = CalendarGenerationForm(request.POST)
@@ -115,48 +141,67 @@ def home(request):
             # Set the year internally based on the selected month
             calendar.year = year_to_print_for(calendar.month)
 
-            # Create directories if they don't exist
-            os.makedirs(os.path.join(settings.MEDIA_ROOT, 'pages'), exist_ok=True)
-            os.makedirs(os.path.join(settings.MEDIA_ROOT, 'calendars'), exist_ok=True)
-
-            # Generate the calendar
-            try:
-                pdf_path = generate_calendar(
-                    calendar.room_type,
-                    calendar.month,
-                    calendar.year
-                )
-
-                # Save the PDF path to the model
-                calendar.pdf_file = pdf_path.replace(str(settings.MEDIA_ROOT) + '/', '')
-                calendar.save()
-
-                # Add success message
-                messages.success(request,
-                                 f"Your calendar for {calendar.get_month_display()} {calendar.year} has been generated successfully.")
+            # Render in the background; the success page follows the progress and can cancel it
+            calendar.status = 'pending'
+            calendar.save()
+            start_generation(calendar.id, profile=profile_requested)
 
-                # Redirect to the success page
-                return redirect('calendar_success', calendar_id=calendar.id)
-            except Exception as e:
-                messages.error(request, f"Error generating calendar: {str(e)}")
+            # Redirect to the success page
+            return redirect('calendar_success', calendar_id=calendar.id)
 
-    return render(request, 'calendar_generator/home.html', {'form': form})
+    return render(request, 'calendar_generator/home.html', {'form': form, 'profile_requested': profile_requested})
 
 
 def calendar_success(request, calendar_id):
     """Success page after calendar generation."""
     try:
         calendar = CalendarGeneration.objects.get(id=calendar_id)
+        if generation_is_stale(calendar):
+            calendar = fail_stale_generation(calendar)
         return render(request, 'calendar_generator/success.html', {'calendar': calendar})
     except CalendarGeneration.DoesNotExist:
         messages.error(request, "Calendar not found.")
         return redirect('home')
 
 
+def calendar_progress(request, calendar_id):
+    """
+    Stream generation progress to the success page as server-sent events.
+
+    The stream ends after PROGRESS_LONG_POLL_TIMEOUT seconds and the browser's
+    EventSource reconnects, so a long render doesn't hold a worker thread throughout.
+    """
+    response = StreamingHttpResponse(progress_events(calendar_id, PROGRESS_LONG_POLL_TIMEOUT),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies such as nginx from buffering the event stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def cancel_calendar(request, calendar_id):
+    """Ask a running generation to stop after its current page."""
+    if request.method != 'POST':
+        return redirect('calendar_success', calendar_id=calendar_id)
+
+    updated = CalendarGeneration.objects.filter(
+        id=calendar_id,
+        status__in=['pending', 'running'],
+    ).update(cancel_requested=True)
+    if updated:
+        messages.success(request, "Calendar generation is being cancelled.")
+    else:
+        messages.error(request, "This calendar is no longer being generated.")
+    return redirect('calendar_success', calendar_id=calendar_id)
+
+
 def download_calendar(request, calendar_id):
     """Download the generated calendar."""
     try:
         calendar = CalendarGeneration.objects.get(id=calendar_id)
+        if calendar.status != 'done':
+            messages.error(request, "This calendar has not finished generating.")
+            return redirect('calendar_success', calendar_id=calendar.id)
         file_path = calendar.pdf_file.path
 
         if os.path.exists(file_path):
@@ -171,10 +216,24 @@ def download_calendar(request, calendar_id):
         return redirect('home')
 
 
+@staff_member_required
+def download_profile(request, calendar_id, kind):
+    """Download the pstats or collapsed-stack profile of a profiled render."""
+    calendar = CalendarGeneration.objects.filter(id=calendar_id).first()
+    profile_file = {'stats': calendar.profile_stats, 'stacks': calendar.profile_stacks}.get(kind) if calendar else None
+    if not profile_file or not os.path.exists(profile_file.path):
+        raise Http404("Profile not found")
+    content_type = 'text/plain' if kind == 'stacks' else 'application/octet-stream'
+    return FileResponse(open(profile_file.path, 'rb'), as_attachment=True, content_type=content_type)
+
+
 def print_calendar(request, calendar_id):
     """Send the generated calendar to the printer."""
     try:
         calendar = CalendarGeneration.objects.get(id=calendar_id)
+        if calendar.status != 'done':
+            messages.error(request, "This calendar has not finished generating.")
+            return redirect('calendar_success', calendar_id=calendar.id)
         file_path = calendar.pdf_file.path
 
         if os.path.exists(file_path):
@@ -188,21 +247,7 @@ def print_calendar(request, calendar_id):
                 network_printer = getattr(settings, 'NETWORK_PRINTER_NAME', None)
 
                 # Send the PDF to the printer using lpr command
-                if network_printer:
-                    # If network printer is configured, specify it with -P option
-                    lpr("-P", network_printer,
-                        "-o", "media=Letter",
-                        "-o", "sides=one-sided",
-                        "-o", "print-quality=5",
-                        "-#", "1",
-                        file_path)
-                else:
-                    # Fall back to default printer if no network printer is configured
-                    lpr("-o", "media=Letter",
-                        "-o", "sides=one-sided",
-                        "-o", "print-quality=5",
-                        "-#", "1",
-                        file_path)
+                lpr(*lpr_arguments(file_path, network_printer))
 
                 if network_printer:
                     messages.success(request, f"Calendar sent to {network_printer} printer successfully. Please find your prints there.")
@@ -223,6 +268,172 @@ def print_calendar(request, calendar_id):
         return redirect('home')
 
 
+def bundle_response(form, asynchronous=False):
+    """Return the streamed ZIP archive or combined PDF for a valid CalendarBundleForm."""
+    pairs = form.cleaned_data['calendars']
+    today = date.today()
+
+    if form.cleaned_data['bundle_format'] == 'pdf':
+        content, content_type = stream_pdf_bundle(pairs), 'application/pdf'
+        filename = f"Calendars_{today:%Y-%m-%d}.pdf"
+    else:
+        content, content_type = stream_zip_bundle(pairs), 'application/zip'
+        filename = f"Calendars_{today:%Y-%m-%d}.zip"
+    if asynchronous:
+        content = iterate_in_thread(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def download_bundle(request):
+    """Download several calendars as one streamed ZIP archive or combined PDF."""
+    form = CalendarBundleForm()
+
+    if request.method == 'POST':
+        form = CalendarBundleForm(request.POST)
+        if form.is_valid():
+            return bundle_response(form)
+
+    return render(request, 'calendar_generator/bundle.html', {'form': form})
+
+
+def preview_calendar(request):
+    """Return a fast, low-resolution preview of a month as a WebP or PNG image."""
+    form = CalendarGenerationForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest("A valid room_type and month are required.")
+    room_type = form.cleaned_data['room_type']
+    month = form.cleaned_data['month']
+    year = year_to_print_for(month)
+
+    try:
+        day = int(request.GET['day']) if request.GET.get('day') else None
+        if day is not None:
+            single_date = date(year, month, day)
+    except ValueError:
+        return HttpResponseBadRequest("day must be a day of the selected month.")
+
+    try:
+        if day is None:
+            preview = render_preview_grid(room_type, month, year)
+        else:
+            resolve = holiday_resolver(room_type, holidays.US(subdiv="MI", years=year))
+            preview = render_preview_page(single_date, room_type, resolve, PREVIEW_PAGE_REDUCE)
+    except OSError as e:
+        return HttpResponseServerError(f"Error rendering preview: {e}")
+
+    image_format = 'png' if request.GET.get('format') == 'png' else 'webp'
+    buffer = io.BytesIO()
+    if image_format == 'webp':
+        # method=0 is the fastest WebP encoder setting
+        preview.convert("RGB").save(buffer, format="webp", quality=80, method=0)
+    else:
+        preview.save(buffer, format="png", compress_level=1)
+    return HttpResponse(buffer.getvalue(), content_type=f'image/{image_format}')
+
+
+async def home_async(request):
+    """Async version of the home view that renders the calendar in the bounded render pool."""
+    form = CalendarGenerationForm()
+    # request.user can't be read from async code, so ask for it here instead of in the template
+    profile_requested = request.GET.get('profile') == '1' and (await request.auser()).is_staff
+
+    if request.method == 'POST':
+        form = CalendarGenerationForm(request.POST)
+        if form.is_valid():
+            calendar = form.save(commit=False)
+
+            # Set the year internally based on the selected month
+            calendar.year = year_to_print_for(calendar.month)
+
+            # Render in the background; the success page follows the progress and can cancel it
+            calendar.status = 'pending'
+            await calendar.asave()
+            start_generation(calendar.id, profile=profile_requested)
+
+            # Redirect to the success page
+            return redirect('calendar_success', calendar_id=calendar.id)
+
+    return render(request, 'calendar_generator/home.html', {'form': form, 'profile_requested': profile_requested})
+
+
+async def download_calendar_async(request, calendar_id):
+    """Async version of download_calendar that reads the file in chunks off the event loop."""
+    try:
+        calendar = await CalendarGeneration.objects.aget(id=calendar_id)
+    except CalendarGeneration.DoesNotExist:
+        messages.error(request, "Calendar not found.")
+        return redirect('home')
+    if calendar.status != 'done':
+        messages.error(request, "This calendar has not finished generating.")
+        return redirect('calendar_success', calendar_id=calendar.id)
+
+    file_path = calendar.pdf_file.path
+    try:
+        file_size = await asyncio.to_thread(os.path.getsize, file_path)
+    except OSError:
+        messages.error(request, "Calendar file not found.")
+        return redirect('home')
+
+    response = StreamingHttpResponse(read_file_async(file_path), content_type='application/pdf')
+    response['Content-Length'] = str(file_size)
+    response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
+    return response
+
+
+async def print_calendar_async(request, calendar_id):
+    """Async version of print_calendar that waits for lpr without blocking the event loop."""
+    try:
+        calendar = await CalendarGeneration.objects.aget(id=calendar_id)
+    except CalendarGeneration.DoesNotExist:
+        messages.error(request, "Calendar not found.")
+        return redirect('home')
+    if calendar.status != 'done':
+        messages.error(request, "This calendar has not finished generating.")
+        return redirect('calendar_success', calendar_id=calendar.id)
+
+    file_path = calendar.pdf_file.path
+    if not await asyncio.to_thread(os.path.exists, file_path):
+        messages.error(request, "Calendar file not found.")
+        return redirect('home')
+
+    # Get the network printer name from settings
+    network_printer = getattr(settings, 'NETWORK_PRINTER_NAME', None)
+    try:
+        await lpr_async(*lpr_arguments(file_path, network_printer))
+
+        if network_printer:
+            messages.success(request, f"Calendar sent to {network_printer} printer successfully. Please find your prints there.")
+        else:
+            messages.success(request, "Calendar sent to default printer successfully.")
+    except PrintError as e:
+        messages.error(request, f"Error sending to printer: {str(e)}")
+    except Exception as e:
+        messages.error(request, f"Error: {str(e)}")
+    return redirect('calendar_success', calendar_id=calendar.id)
+
+
+async def download_bundle_async(request):
+    """Async version of download_bundle that streams each part as soon as it is ready."""
+    form = CalendarBundleForm()
+
+    if request.method == 'POST':
+        form = CalendarBundleForm(request.POST)
+        if form.is_valid():
+            return bundle_response(form, asynchronous=True)
+
+    return render(request, 'calendar_generator/bundle.html', {'form': form})
+
+
+async def calendar_progress_async(request, calendar_id):
+    """Async version of calendar_progress that waits between updates without holding a thread."""
+    response = StreamingHttpResponse(progress_events_async(calendar_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # Helper functions for calendar generation
 def year_to_print_for(month):
     if datetime.today().month >= 11 and month <= 2:
@@ -230,6 +441,21 @@ def year_to_print_for(month):
     return datetime.today().year
 
 
+def upcoming_months(count):
+    """
+    Yield (month, year) for the next ``count`` months, starting with next month.
+
+    Months whose year differs from what year_to_print_for would pick are skipped,
+    since a request for that month would render a different year.
+    """
+    today = datetime.today()
+    for offset in range(1, count + 1):
+        month_index = today.month - 1 + offset
+        month, year = month_index % 12 + 1, today.year + month_index // 12
+        if year_to_print_for(month) == year:
+            yield month, year
+
+
 def get_printing_end_date(month_name, year, month_number):
     if month_name == "December":
         return date(year + 1, 1, 1)
@@ -241,89 +467,143 @@ def daterange_to_print(first_date, last_date):
         yield first_date + timedelta(n)
 
 
-def standard_week(single_date, study_room_mode):
-    """Create a mutable calendar sheet based on the mode and current day of the week."""
-    static_dir = os.path.join(settings.STATIC_ROOT)
-
-    if study_room_mode == 'study':
-        match single_date.weekday():
-            case 6:
-                calendar_sheet = Image.open(os.path.join(static_dir, SR_SUNDAY_HOURS)).convert("RGB").copy()
-            case 5:
-                calendar_sheet = Image.open(os.path.join(static_dir, SR_SATURDAY_HOURS)).convert("RGB").copy()
-            case 4:
-                calendar_sheet = Image.open(os.path.join(static_dir, SR_FRIDAY_HOURS)).convert("RGB").copy()
-            case _:
-                calendar_sheet = Image.open(os.path.join(static_dir, SR_WEEKDAY_HOURS)).convert("RGB").copy()
-    else:
-        match single_date.weekday():
-            case 6:
-                calendar_sheet = Image.open(os.path.join(static_dir, PR_SUNDAY_HOURS)).convert("RGB").copy()
-            case 5:
-                calendar_sheet = Image.open(os.path.join(static_dir, PR_SATURDAY_HOURS)).convert("RGB").copy()
-            case 4:
-                calendar_sheet = Image.open(os.path.join(static_dir, PR_FRIDAY_HOURS)).convert("RGB").copy()
-            case _:
-                calendar_sheet = Image.open(os.path.join(static_dir, PR_WEEKDAY_HOURS)).convert("RGB").copy()
-    return calendar_sheet
+def standard_week(single_date, room_type):
+    """Create a mutable calendar sheet based on the room type and current day of the week."""
+    return engine.standard_week(single_date, render_plan(room_type))
 
 
-def draw_dates(calendarsheet, single_date):
-    """Draw dates on each day of the calendar."""
-    draw_dates_ = ImageDraw.Draw(calendarsheet)
-    font = ImageFont.truetype(DATE_STRING_FONT_PATH, 80)
-    draw_dates_.text(
-        (3274, 114),
-        single_date.strftime("%A — %b, %d, %Y"),
-        (0, 0, 0),
-        anchor="rs",
-        font=font,
-    )
+def overlays(calendar_sheet, calendar_sheet_filename, art_to_use, closed_overlay):
+    """Imprint closure and/or holiday artwork, resolving relative paths against STATIC_ROOT."""
+    return engine.overlays(calendar_sheet, calendar_sheet_filename, art_to_use, closed_overlay, settings.STATIC_ROOT)
 
 
-def overlays(calendar_sheet, calendar_sheet_filename, art_to_use, building_closure):
+def day_overlays(single_date, room_type, michigan_holidays):
     """
-    Imprint closure and/or holiday artwork.
+    Resolve the holiday artwork and closure status for a single day.
+
+    Checks the holiday index against the table on every call; use holiday_resolver
+    for more than one day.
 
     Returns:
-        PIL.Image: The modified calendar sheet with overlays applied
+        tuple: (artwork_path or None, should_show_closed)
     """
-    static_dir = os.path.join(settings.STATIC_ROOT)
+    # Get holiday artwork and closure status, checking for public holidays by name first
+    holiday_info = get_holiday_info(michigan_holidays.get(single_date), single_date.strftime("%Y-%m-%d"))
+    return engine.day_overlays(single_date, render_plan(room_type), holiday_info)
 
-    # Convert calendar_sheet to RGBA mode to properly handle alpha channels
-    if calendar_sheet.mode != "RGBA":
-        calendar_sheet = calendar_sheet.convert("RGBA")
 
-    # Handle cases where one or both overlays are present
-    if art_to_use:
-        # Determine the artwork path
-        if os.path.isabs(art_to_use):
-            art_path = art_to_use
-        else:
-            art_path = os.path.join(static_dir, art_to_use)
+def holiday_resolver(room_type, michigan_holidays):
+    """
+    Return a ``resolve(date)`` callable giving each day's (artwork_path or None, should_show_closed).
 
-        artwork_image = Image.open(art_path).convert("RGBA")
-        calendar_sheet = Image.alpha_composite(calendar_sheet, artwork_image)
+    The holiday index is checked against the table once, here, so resolving every day of
+    a month costs one query instead of one per day.
+    """
+    return engine.index_resolver(render_plan(room_type), holiday_index(), michigan_holidays)
 
-    if building_closure:
-        # Determine the closure image path
-        if os.path.isabs(STATUS_CLOSED):
-            closure_path = STATUS_CLOSED
-        else:
-            closure_path = os.path.join(static_dir, STATUS_CLOSED)
 
-        closure_image = Image.open(closure_path).convert("RGBA")
-        calendar_sheet = Image.alpha_composite(calendar_sheet, closure_image)
+def render_pages_batched(days, room_type, michigan_holidays):
+    """Render pages with the NumPy backend, yielding (date, RGB page) pairs group by group."""
+    return engine.render_pages_batched(days, render_plan(room_type), holiday_resolver(room_type, michigan_holidays),
+                                       settings.STATIC_ROOT)
 
-    # Save a PNG version for reference
-    calendar_sheet.save(calendar_sheet_filename, format="png")
 
-    # Return the modified calendar sheet
-    return calendar_sheet
+def render_pages(days, room_type, michigan_holidays):
+    """
+    Render pages with the configured compositing backend, yielding (date, RGB page) pairs.
 
+    The NumPy backend yields pages group by group, not in date order.
+    """
+    return engine.render_pages(days, render_plan(room_type), holiday_resolver(room_type, michigan_holidays),
+                               getattr(settings, 'COMPOSITING_BACKEND', 'pil'), settings.STATIC_ROOT)
+
+
+def calendar_output_path(room_type, month, year):
+    """Return where the merged PDF for a room type and month is saved."""
+    month_name = dict(CalendarGeneration.MONTH_CHOICES)[month]
+    room_type_label = render_plan(room_type).label
+    return os.path.join(settings.MEDIA_ROOT, 'calendars', f"{room_type_label}_{month_name}_{year}.pdf")
+
+
+def holiday_plan_fingerprint(room_type, month, year):
+    """
+    Fingerprint everything that decides how a month renders.
+
+    This covers each day's template, holiday artwork and closure status, the date
+    placement, the output profile and the modification times of the asset files, so
+    any holiday, layout, profile or asset edit changes it.
+    """
+    month_name = dict(CalendarGeneration.MONTH_CHOICES)[month]
+    michigan_holidays = holidays.US(subdiv="MI", years=year)
+    plan = render_plan(room_type)
+    profile = output_profile()
+    digest = hashlib.sha256()
+    digest.update(f"{plan.date_position}|{plan.date_size}|{plan.date_font}|{plan.page_size}\n".encode())
+    digest.update(f"{profile.name}|{profile.describe()}\n".encode())
+
+    def add_asset(path):
+        try:
+            modified_time = os.path.getmtime(static_asset_path(path))
+        except OSError:
+            modified_time = None
+        digest.update(f"{path}|{modified_time}\n".encode())
+
+    add_asset(plan.closed_overlay)
+    resolve = holiday_resolver(room_type, michigan_holidays)
+    for single_date in daterange_to_print(date(year, month, 1), get_printing_end_date(month_name, year, month)):
+        holiday_artwork, should_show_closed = resolve(single_date)
+        digest.update(f"{single_date}|{should_show_closed}\n".encode())
+        add_asset(plan.template_for(single_date))
+        if holiday_artwork:
+            add_asset(holiday_artwork)
+    return digest.hexdigest()[:16]
+
+
+def generate_calendar_once(room_type, month, year, progress=None):
+    """
+    Generate a calendar unless an identical one is already rendering or rendered.
+
+    Concurrent requests for the same room type, month and holiday plan share a single
+    generate_calendar run, across threads and (through a lock file) across processes.
+    The fingerprint of the last render is kept next to the PDF, so a finished calendar
+    is reused until its holidays or assets change. Every caller sharing a render in this
+    process receives its ``progress`` callbacks, and the render only stops once all of
+    them have raised GenerationCancelled. Callers waiting on another process's render
+    receive none.
+    """
+    fingerprint = holiday_plan_fingerprint(room_type, month, year)
+    output_path = calendar_output_path(room_type, month, year)
+    fingerprint_path = os.path.join(os.path.dirname(output_path), f".{os.path.basename(output_path)}.fingerprint")
+    lock_path = os.path.join(settings.MEDIA_ROOT, 'locks', f"{room_type}-{year}-{month:02d}.lock")
+
+    def generate_or_reuse():
+        # Another process may have finished this exact calendar while we waited for the lock
+        try:
+            with open(fingerprint_path) as fingerprint_file:
+                if fingerprint_file.read() == fingerprint and os.path.exists(output_path):
+                    return output_path
+        except OSError:
+            pass
+
+        pdf_path = generate_calendar(room_type, month, year, progress=_generation_progress.reporter(key))
+        with open(fingerprint_path, 'w') as fingerprint_file:
+            fingerprint_file.write(fingerprint)
+        return pdf_path
+
+    key = (room_type, month, year, fingerprint)
+    # Callers without a progress callback still count, so cancelling the others doesn't stop their render
+    with _generation_progress.listen(key, progress or (lambda *args: None)):
+        return _generation_flight.do(key, generate_or_reuse, lock_path=lock_path)
+
+
+def generate_calendar(room_type, month, year, progress=None):
+    """
+    Generate a calendar for the specified month, year, and room type.
 
-def generate_calendar(room_type, month, year):
-    """Generate a calendar for the specified month, year, and room type."""
+    ``progress``, if given, is called after every page as
+    ``progress(pages_done, total_pages, seconds_per_page)``. It may raise
+    GenerationCancelled to stop the render; temporary files are removed either way.
+    """
     # Get month name
     month_name = dict(CalendarGeneration.MONTH_CHOICES)[month]
 
@@ -331,70 +611,440 @@ def generate_calendar(room_type, month, year):
     printing_start_date = date(year, month, 1)
     printing_end_date = get_printing_end_date(month_name, year, month)
 
-    # Set up directories
-    pages_dir = os.path.join(settings.MEDIA_ROOT, 'pages')
-    calendars_dir = os.path.join(settings.MEDIA_ROOT, 'calendars')
-    os.makedirs(pages_dir, exist_ok=True)
-    os.makedirs(calendars_dir, exist_ok=True)
-
-    # Initialize PDF merger
-    merger = PdfMerger()
+    # Pages are written to a private directory under MEDIA_ROOT/pages, then merged into the calendars directory
     michigan_holidays = holidays.US(subdiv="MI", years=year)
+    plan = render_plan(room_type)
+    days = list(daterange_to_print(printing_start_date, printing_end_date))
+    return engine.write_calendar_pdf(
+        days,
+        render_pages(days, room_type, michigan_holidays),
+        output_profile(),
+        plan.page_size,
+        calendar_output_path(room_type, month, year),
+        os.path.join(settings.MEDIA_ROOT, 'pages'),
+        progress,
+    )
+
+
+def start_generation(calendar_id, profile=False):
+    """
+    Render a saved CalendarGeneration in the background render pool.
+
+    Only touches the database from the pool thread, so the async views can call it
+    from the event loop.
+    """
+    with _active_generations_lock:
+        _active_generations.add(calendar_id)
+    start_heartbeats()
+    future = _render_executor.submit(run_generation, calendar_id, profile)
+    future.add_done_callback(lambda _: forget_generation(calendar_id))
+    return future
+
+
+def forget_generation(calendar_id):
+    with _active_generations_lock:
+        _active_generations.discard(calendar_id)
+
+
+def start_heartbeats():
+    """Start the thread that keeps this process's generations from looking stale, once per process."""
+    global _heartbeat_thread
+    with _active_generations_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=send_heartbeats, name='calendar-heartbeat', daemon=True)
+            _heartbeat_thread.start()
+
+
+def send_heartbeats():
+    """Mark every generation queued or running in this process as alive, every GENERATION_HEARTBEAT_INTERVAL."""
+    while True:
+        time.sleep(GENERATION_HEARTBEAT_INTERVAL)
+        with _active_generations_lock:
+            calendar_ids = list(_active_generations)
+        if not calendar_ids:
+            continue
+        try:
+            CalendarGeneration.objects.filter(id__in=calendar_ids).update(heartbeat_at=timezone.now())
+        except DatabaseError:
+            # Try again at the next beat; a generation only goes stale after several missed ones
+            pass
+        finally:
+            close_old_connections()
+
+
+def stale_generations():
+    """Pending and running generations that no worker has marked for GENERATION_STALE_AFTER seconds."""
+    cutoff = timezone.now() - timedelta(seconds=GENERATION_STALE_AFTER)
+    return CalendarGeneration.objects.filter(status__in=['pending', 'running']).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, created_at__lt=cutoff)
+    )
+
+
+def generation_is_stale(calendar):
+    """Whether a generation read from the database is one stale_generations would find."""
+    last_seen = calendar.heartbeat_at or calendar.created_at
+    return (calendar.status in ('pending', 'running')
+            and last_seen < timezone.now() - timedelta(seconds=GENERATION_STALE_AFTER))
+
+
+def fail_stale_generation(calendar):
+    """Mark a stale generation failed, unless a worker marked it meanwhile, and return it as stored."""
+    stale_generations().filter(id=calendar.id).update(status='failed', error=STALE_GENERATION_ERROR)
+    return CalendarGeneration.objects.get(id=calendar.id)
+
+
+def generate_calendar_profiled(calendar, progress):
+    """
+    Render a calendar under the profiler, recording the profile files on it.
+
+    The render always runs, instead of sharing another request's render or reusing a
+    cached PDF, so the profile shows where the time of a real render goes.
+    """
+    profile_base = os.path.join(settings.MEDIA_ROOT, 'profiles',
+                                f"calendar-{calendar.id}-{datetime.now():%Y%m%d-%H%M%S}")
+    try:
+        with capture_profile(profile_base):
+            return generate_calendar(calendar.room_type, calendar.month, calendar.year, progress=progress)
+    finally:
+        CalendarGeneration.objects.filter(id=calendar.id).update(
+            profile_stats=os.path.relpath(f"{profile_base}.pstats", settings.MEDIA_ROOT),
+            profile_stacks=os.path.relpath(f"{profile_base}.collapsed", settings.MEDIA_ROOT),
+        )
+
+
+def run_generation(calendar_id, profile=False):
+    """
+    Generate the PDF for a CalendarGeneration, recording progress on the model.
+
+    Progress is stored in the database so the progress stream and the cancel
+    action work from any worker process; every page also counts as a heartbeat.
+    With ``profile``, the render is profiled (see generate_calendar_profiled).
+    Generations left pending or running by a stopped worker are marked failed first.
+    """
+    calendars = CalendarGeneration.objects.filter(id=calendar_id)
 
-    # Generate calendar pages
-    for single_date in daterange_to_print(printing_start_date, printing_end_date):
-        calendar_sheet_filename = os.path.join(
-            pages_dir,
-            single_date.strftime("Calendar %A %b %d %Y.pdf")
+    def record_progress(pages_done, total_pages, seconds_per_page):
+        calendars.update(pages_done=pages_done, total_pages=total_pages, seconds_per_page=seconds_per_page,
+                         heartbeat_at=timezone.now())
+        if calendars.filter(cancel_requested=True).exists():
+            raise GenerationCancelled()
+
+    try:
+        stale_generations().update(status='failed', error=STALE_GENERATION_ERROR)
+        calendar = calendars.get()
+        calendars.update(status='running', heartbeat_at=timezone.now())
+        if profile:
+            pdf_path = generate_calendar_profiled(calendar, record_progress)
+        else:
+            try:
+                pdf_path = generate_calendar_once(calendar.room_type, calendar.month, calendar.year,
+                                                  progress=record_progress)
+            except GenerationCancelled:
+                if calendars.filter(cancel_requested=True).exists():
+                    raise
+                # The shared render was cancelled by the other requests just as this one joined it
+                pdf_path = generate_calendar_once(calendar.room_type, calendar.month, calendar.year,
+                                                  progress=record_progress)
+            # A render shared with other requests carries on when only this one is cancelled
+            if calendars.filter(cancel_requested=True).exists():
+                raise GenerationCancelled()
+
+        calendars.update(
+            status='done',
+            pdf_file=pdf_path.replace(str(settings.MEDIA_ROOT) + '/', ''),
         )
+    except GenerationCancelled:
+        calendars.update(status='cancelled')
+    except Exception as e:
+        calendars.update(status='failed', error=str(e))
+    finally:
+        close_old_connections()
+
+
+def progress_event(calendar):
+    """Format a CalendarGeneration's progress as one server-sent event."""
+    data = {
+        'status': calendar.status,
+        'pages_done': calendar.pages_done,
+        'total_pages': calendar.total_pages,
+        'seconds_per_page': round(calendar.seconds_per_page, 2) if calendar.seconds_per_page else None,
+        'error': calendar.error,
+    }
+    if calendar.total_pages and calendar.status == 'running':
+        data['message'] = (f"page {calendar.pages_done}/{calendar.total_pages}, "
+                           f"{calendar.seconds_per_page:.2f} s/page")
+    else:
+        data['message'] = calendar.get_status_display()
+    return f"event: progress\ndata: {json.dumps(data)}\n\n"
+
+
+def progress_events(calendar_id, timeout=PROGRESS_STREAM_TIMEOUT):
+    """Yield progress events until the generation finishes or ``timeout`` seconds pass."""
+    last_event = None
+    deadline = time.monotonic() + timeout
+    try:
+        yield f"retry: {PROGRESS_RETRY_INTERVAL * 1000}\n\n"
+        while time.monotonic() < deadline:
+            calendar = CalendarGeneration.objects.filter(id=calendar_id).first()
+            if calendar is None:
+                return
+            if generation_is_stale(calendar):
+                calendar = fail_stale_generation(calendar)
+            event = progress_event(calendar)
+            if event != last_event:
+                yield event
+                last_event = event
+            if calendar.is_finished:
+                return
+            time.sleep(PROGRESS_POLL_INTERVAL)
+    finally:
+        close_old_connections()
+
+
+async def progress_events_async(calendar_id):
+    """Async version of progress_events, which follows the generation for PROGRESS_STREAM_TIMEOUT."""
+    last_event = None
+    deadline = time.monotonic() + PROGRESS_STREAM_TIMEOUT
+    yield f"retry: {PROGRESS_RETRY_INTERVAL * 1000}\n\n"
+    while time.monotonic() < deadline:
+        calendar = await CalendarGeneration.objects.filter(id=calendar_id).afirst()
+        if calendar is None:
+            return
+        if generation_is_stale(calendar):
+            calendar = await sync_to_async(fail_stale_generation)(calendar)
+        event = progress_event(calendar)
+        if event != last_event:
+            yield event
+            last_event = event
+        if calendar.is_finished:
+            return
+        await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+
+
+def static_asset_path(path):
+    """Resolve an asset path relative to STATIC_ROOT unless it is already absolute."""
+    return engine.asset_path(path, settings.STATIC_ROOT)
+
+
+@lru_cache(maxsize=64)
+def _load_scaled_asset(path, reduce_factor, modified_time):
+    image = Image.open(path)
+    # Lets JPEG artwork decode straight at the smaller size; a no-op for PNG
+    image.draft("RGB", (image.width // reduce_factor, image.height // reduce_factor))
+    return image.convert("RGBA").reduce(reduce_factor)
+
+
+def scaled_asset(path, reduce_factor):
+    """
+    Return an asset shrunk by an integer factor, cached until the file changes.
+
+    The returned image is shared between requests and must be copied before drawing on it.
+    """
+    path = static_asset_path(path)
+    return _load_scaled_asset(path, reduce_factor, os.path.getmtime(path))
+
+
+def render_preview_page(single_date, room_type, resolve, reduce_factor):
+    """
+    Render one page like generate_calendar does, but from pre-scaled assets.
 
-        # Figure out which image should be the basis for our calendar page
-        calendar_sheet = standard_week(single_date, room_type)
-
-        # Draw correct dates
-        draw_dates(calendar_sheet, single_date)
-
-        # Check for holidays
-        holiday_name = michigan_holidays.get(single_date)
-        formatted_date = single_date.strftime("%Y-%m-%d")
-        
-        # Get holiday artwork and closure status
-        holiday_info = get_holiday_info(holiday_name, formatted_date)
-        
-        # Determine if building should be marked as closed
-        is_sunday = single_date.weekday() == 6
-        should_show_closed = is_sunday or (holiday_info and holiday_info[1])
-        
-        # Get holiday artwork if it exists
-        holiday_artwork = holiday_info[0] if holiday_info else None
-        
-        # Apply overlays with both holiday artwork and closure status when applicable
-        calendar_sheet = overlays(
-            calendar_sheet,
-            calendar_sheet_filename,
-            holiday_artwork,
-            should_show_closed
+    ``resolve`` is a holiday_resolver for the page's room type.
+    """
+    plan = render_plan(room_type)
+    calendar_sheet = scaled_asset(plan.template_for(single_date), reduce_factor).copy()
+    draw_dates(calendar_sheet, single_date, plan, scale=1 / reduce_factor)
+
+    holiday_artwork, should_show_closed = resolve(single_date)
+    if holiday_artwork:
+        calendar_sheet.alpha_composite(scaled_asset(holiday_artwork, reduce_factor))
+    if should_show_closed:
+        calendar_sheet.alpha_composite(scaled_asset(plan.closed_overlay, reduce_factor))
+    return calendar_sheet
+
+
+def render_preview_grid(room_type, month, year):
+    """Render every page of the month as thumbnails laid out in Sunday-first weeks."""
+    month_name = dict(CalendarGeneration.MONTH_CHOICES)[month]
+    first_date = date(year, month, 1)
+    resolve = holiday_resolver(room_type, holidays.US(subdiv="MI", years=year))
+
+    thumbnail_width, thumbnail_height = scaled_asset(render_plan(room_type).template_for(first_date),
+                                                     PREVIEW_THUMBNAIL_REDUCE).size
+    cell_width = thumbnail_width + PREVIEW_GRID_PADDING
+    cell_height = thumbnail_height + PREVIEW_GRID_PADDING
+    leading_days = (first_date.weekday() + 1) % 7
+    days = list(daterange_to_print(first_date, get_printing_end_date(month_name, year, month)))
+    rows = (leading_days + len(days) + 6) // 7
+
+    grid = Image.new("RGB", (7 * cell_width + PREVIEW_GRID_PADDING, rows * cell_height + PREVIEW_GRID_PADDING),
+                     (255, 255, 255))
+    for index, single_date in enumerate(days, start=leading_days):
+        thumbnail = render_preview_page(single_date, room_type, resolve, PREVIEW_THUMBNAIL_REDUCE)
+        row, column = divmod(index, 7)
+        grid.paste(thumbnail.convert("RGB"),
+                   (column * cell_width + PREVIEW_GRID_PADDING, row * cell_height + PREVIEW_GRID_PADDING))
+    return grid
+
+
+def lpr_arguments(file_path, network_printer=None):
+    """Build the lpr command line for printing a calendar PDF."""
+    arguments = []
+    if network_printer:
+        # If network printer is configured, specify it with -P option
+        arguments += ["-P", network_printer]
+    # Otherwise lpr falls back to the default printer
+    arguments += [
+        "-o", "media=Letter",
+        "-o", "sides=one-sided",
+        "-o", "print-quality=5",
+        "-#", "1",
+        file_path,
+    ]
+    return arguments
+
+
+async def lpr_async(*args):
+    """Run lpr as an asyncio subprocess and raise PrintError if it fails."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "lpr", *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
         )
+    except FileNotFoundError:
+        raise PrintError("The lpr command is not available on this server.")
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise PrintError(stderr.decode(errors='replace').strip() or f"lpr exited with status {process.returncode}")
 
-        # Convert back to RGB for PDF saving if needed
-        if calendar_sheet.mode == "RGBA":
-            calendar_sheet = calendar_sheet.convert("RGB")
 
-        # Save the calendar page with overlays
-        calendar_sheet.save(calendar_sheet_filename, format="pdf")
+async def read_file_async(file_path):
+    """Yield a file in STREAM_CHUNK_SIZE pieces, reading each one in a worker thread."""
+    source = await asyncio.to_thread(open, file_path, 'rb')
+    try:
+        while chunk := await asyncio.to_thread(source.read, STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await asyncio.to_thread(source.close)
+
+
+def find_or_generate_calendar(room_type, month, year):
+    """Return a saved calendar for the room and month, generating the PDF only if it is missing or outdated."""
+    pdf_path = generate_calendar_once(room_type, month, year)
+    pdf_file = pdf_path.replace(str(settings.MEDIA_ROOT) + '/', '')
+
+    calendar = CalendarGeneration.objects.filter(pdf_file=pdf_file, status='done').order_by('-created_at').first()
+    if calendar is None:
+        calendar = CalendarGeneration(room_type=room_type, month=month, year=year, pdf_file=pdf_file,
+                                      status='done')
+        calendar.save()
+    return calendar
+
+
+class _BundleBuffer:
+    """Write-only file object that hands written bytes back to the streaming generator."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
 
-        # Add to merger
-        merger.append(calendar_sheet_filename)
+def stream_zip_bundle(pairs):
+    """
+    Yield a ZIP archive of the requested calendars, one part at a time.
+
+    Each calendar is generated (or reused) only when the archive reaches it and its
+    PDF is copied in STREAM_CHUNK_SIZE pieces, so the bundle is never held in memory.
+    """
+    buffer = _BundleBuffer()
+    # PDFs are already compressed, so store them as-is
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for room_type, month in pairs:
+            calendar = find_or_generate_calendar(room_type, month, year_to_print_for(month))
+            file_path = calendar.pdf_file.path
+
+            with open(file_path, 'rb') as source, archive.open(os.path.basename(file_path), mode='w') as target:
+                while chunk := source.read(STREAM_CHUNK_SIZE):
+                    target.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def stream_pdf_bundle(pairs):
+    """
+    Yield the requested calendars merged into one PDF, one calendar at a time.
+
+    Each calendar is generated (or reused) only when the bundle reaches it, and its
+    pages are written out and sent before the next one starts, so only one
+    calendar is in memory at a time.
+    """
+    buffer = _BundleBuffer()
+    writer = StreamingPdfWriter(buffer)
+    for room_type, month in pairs:
+        calendar = find_or_generate_calendar(room_type, month, year_to_print_for(month))
+        writer.add_pdf(calendar.pdf_file.path)
+        yield buffer.drain()
+    writer.close()
+    yield buffer.drain()
 
-    # Save the merged PDF
-    room_type_label = "Study Room" if room_type == 'study' else "Program Room"
-    calendar_name = f"{room_type_label}_{month_name}_{year}.pdf"
-    output_path = os.path.join(calendars_dir, calendar_name)
-    merger.write(output_path)
-    merger.close()
 
-    # Clean up temporary files
-    for file in os.scandir(pages_dir):
-        os.remove(file.path)
+async def iterate_in_thread(iterable, max_pending=BUNDLE_QUEUE_SIZE):
+    """
+    Yield the items of a sync iterable, which is driven in a worker thread.
+
+    Django would otherwise consume a sync streaming iterator completely before the
+    first byte is sent under ASGI. At most ``max_pending`` items wait between the
+    thread and the response, and the thread stops when the client goes away.
+    """
+    items = queue.Queue(max_pending)
+    stopped = threading.Event()
+    finished, waiting = object(), object()
 
-    return output_path
\ No newline at end of file
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=PROGRESS_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(finished)
+        except Exception as e:
+            put(e)
+        finally:
+            close_old_connections()
+
+    def take():
+        # Time out now and then, so no thread stays blocked here once the response is closed
+        try:
+            return items.get(timeout=PROGRESS_POLL_INTERVAL)
+        except queue.Empty:
+            return waiting
+
+    threading.Thread(target=produce, name='bundle-stream', daemon=True).start()
+    try:
+        while (item := await asyncio.to_thread(take)) is not finished:
+            if isinstance(item, Exception):
+                raise item
+            if item is not waiting:
+                yield item
+    finally:
+        stopped.set()
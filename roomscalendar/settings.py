@@ -72,10 +72,28 @@ WSGI_APPLICATION = 'roomscalendar.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite is tuned for several calendar generations running at once:
+# - WAL journal mode lets holiday reads continue while a CalendarGeneration row is written
+# - synchronous=NORMAL is durable in WAL mode and avoids an fsync on every commit
+# - timeout makes a writer wait for the lock (in seconds) instead of failing with "database is locked"
+# - IMMEDIATE transactions take the write lock up front, so waiting writers honour the timeout
+#   instead of failing when a read transaction tries to upgrade to a write
+# - CONN_MAX_AGE keeps connections (and their PRAGMAs) open between requests
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+        'TEST': {
+            # Use a file rather than an in-memory database so tests run with WAL enabled
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -128,3 +146,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Printer settings
 NETWORK_PRINTER_NAME = 'Ricoh'  # Name of the networked printer
+
+# Calendar generation settings
+ASYNC_VIEWS = False  # Use the async home, download and print views (enable when serving through asgi.py)
+RENDER_WORKERS = 4  # Maximum number of calendars the async views render at the same time
+COMPOSITING_BACKEND = 'pil'  # 'numpy' blends shared overlays once per group of pages (requires numpy)
+OUTPUT_PROFILE = 'print'  # Resolution, color mode and compression of the PDF pages, see calendar_generator/pdf_output.py